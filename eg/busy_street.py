@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+#
+# Example of a setting with a crowd in it: like not_the_swallows.py, but
+# downtown is full of people going about their business.
+#
+
+from os.path import realpath, dirname, join
+import sys
+
+# get the ../src/ directory onto the Python module search path
+sys.path.insert(0, join(dirname(realpath(sys.argv[0])), '..', 'src'))
+
+from swallows.engine.events import Publisher
+from swallows.engine.crowd import Crowd
+from swallows.engine.objects import Location, ProperLocation, Male
+
+### world ###
+
+main_street = ProperLocation("Main Street", noun="street")
+butchers = Location("butcher's", noun="store")
+bakery = Location("bakery", noun="store")
+candlestick_factory = Location("candlestick factory", noun="building")
+town_square = ProperLocation("Town Square", noun="square")
+park = Location("park", noun="park")
+
+main_street.set_exits(butchers, bakery, candlestick_factory, town_square)
+butchers.set_exits(main_street)
+bakery.set_exits(main_street)
+candlestick_factory.set_exits(main_street)
+town_square.set_exits(main_street, park)
+park.set_exits(town_square)
+
+downtown = (main_street, butchers, bakery, candlestick_factory,
+            town_square, park)
+
+class Tweedle(Male):
+    def live(self):
+        self.wander()
+
+tweedledee = Tweedle('Tweedledee')
+tweedledum = Tweedle('Tweedledum')
+
+# a crowd of shoppers; only the ones who cross paths with the Tweedles are
+# ever written about, and the rest cost next to nothing.  (on a bigger map,
+# you could have thousands; use_numpy=True, if you have NumPy.)
+shoppers = Crowd(downtown, 40, name='shopper', mobility=0.2)
+
+### main ###
+
+publisher = Publisher(
+    characters=(
+        tweedledee,
+        tweedledum,
+    ),
+    setting=downtown,
+    title="A BUSY DAY DOWNTOWN",
+    crowds=(shoppers,),
+)
+publisher.publish()
@@ -18,7 +18,7 @@ from swallows.story.world import (
     revolver, brandy, dead_body
 )
 from swallows.engine.objects import (
-    ProperContainer, Item, Location
+    ProperContainer, Item, Location, ProperLocation
 )
 
 # we extend the world of The Swallows by adding a new character.
@@ -40,7 +40,7 @@ fred.configure_objects(
 freds_office = ProperLocation("<*> office", owner=fred)
 freds_office.set_exits(upstairs_hall)
 
-upstairs_hall.set_exits(freds_office) # adds to existing (unknown) exits
+upstairs_hall.add_exits(freds_office) # adds to existing (unknown) exits
 
 # we extend the world by adding some Objects
 # "ProperContainer" and "Item" are imported from swallows.engine.objects
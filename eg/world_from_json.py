@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+#
+# Example of loading a world from a JSON definition rather than building it
+# in Python.  usage: world_from_json.py [world.json]
+#
+
+from os.path import realpath, dirname, join
+import sys
+
+# get the ../src/ directory onto the Python module search path
+sys.path.insert(0, join(dirname(realpath(sys.argv[0])), '..', 'src'))
+
+from swallows.engine.events import Publisher
+from swallows.engine.worlds import load_world
+
+if len(sys.argv) > 1:
+    path = sys.argv[1]
+else:
+    path = join(dirname(realpath(sys.argv[0])), 'the_swallows.json')
+
+# the compiled world is cached next to the definition, and used as long as
+# the definition doesn't change
+world = load_world(path, cache_dir=join(dirname(realpath(path)), '.worlds'))
+
+### main ###
+
+publisher = Publisher(
+    characters=world.characters,
+    setting=world.setting,
+    title="Dial S for Swallows",
+    friffery=True,
+)
+publisher.publish()
@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+
+#
+# check.py: check that the parts of the engine the stock scripts don't
+# exercise (or whose output golden.py can't see) still do what they say.
+#
+# usage:
+#   check.py [CHECK ...]
+#       run each of the named checks (or every one there is), each in a
+#       process of its own, as the worlds live in module globals.  exits
+#       with status 1 if any of them fail.
+#
+
+from os.path import realpath, dirname, join
+import os
+import subprocess
+import sys
+
+HERE = dirname(realpath(sys.argv[0]))
+SRC = join(HERE, '..', 'src')
+
+SEED = 1
+CHAPTERS = 3
+
+# get the ../src/ directory onto the Python module search path
+sys.path.insert(0, SRC)
+
+
+def quiet_publisher(**kwargs):
+    """A Publisher of a few chapters of the_swallows, from a fixed seed,
+    which writes them nowhere (a plain Writer writes nothing.)
+
+    """
+    # the world makes some random decisions of its own while it's being
+    # set up, so seed those first (as golden.py does)
+    from swallows.engine.rng import streams
+    streams.seed(SEED)
+    from swallows.engine.events import Publisher
+    from swallows.engine.writers import Writer
+    from swallows.story.world import alice, bob, house
+    options = dict(characters=(alice, bob), setting=house, seed=SEED,
+                   chapters=CHAPTERS, writers=[Writer()])
+    options.update(kwargs)
+    return Publisher(**options)
+
+### checks ###
+
+
+def check_chapter_history_seek():
+    from swallows.engine.objects import registry
+    publisher = quiet_publisher(checkpoint_interval=50)
+    # (just simulated, not edited, as the Editor rewrites the events)
+    publisher.simulate_chapter(1)
+    history = publisher.histories[1]
+    original = [str(e) for e in history.events]
+
+    def seek(index):
+        event = history.seek(index)
+        replayed = history.characters[0].collector.events
+        assert [str(e) for e in replayed] == original[:len(replayed)]
+        assert len(replayed) > index
+        return (str(event), registry.snapshot())
+
+    # seeking from the nearest checkpoint lands in the same place as
+    # replaying the whole chapter from the first one does
+    for index in (history.checkpoints[0].event_count, 75, 330):
+        nearest = seek(index)
+        history.nearest_checkpoint = lambda index: history.checkpoints[0]
+        from_start = seek(index)
+        del history.nearest_checkpoint
+        assert nearest[0] == from_start[0] == original[index]
+        assert nearest[1] == from_start[1]
+
+    # the events before the first turn can't be sought to
+    for index in (0, history.checkpoints[0].event_count - 1, len(original)):
+        try:
+            history.seek(index)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('seek(%d) was allowed' % index)
+
+
+def check_coordinator_missing_chapters():
+    from StringIO import StringIO
+    from swallows.engine.distributed import Coordinator
+    coordinator = Coordinator([('novel', 3, 0)])
+    coordinator.server.server_close()
+    for chapter_num in (1, 3):
+        coordinator.results[('novel', chapter_num)] = {
+            'title': u'Title', 'text': u'chapter %d\n' % chapter_num,
+        }
+    stream = StringIO()
+    missing = coordinator.write_novel('novel', stream)
+    assert missing == [2], missing
+    # the chapters after the missing one are still written
+    assert stream.getvalue().endswith('chapter 1\nchapter 3\n'), stream.getvalue()
+
+
+def check_event_forms():
+    from swallows.engine.event import Event
+    from swallows.engine.objects import Item, Location
+
+    class Heirloom(Item):
+        __slots__ = ()
+
+        def indefinite(self):
+            return 'a certain %s' % self.name
+
+    room = Location('parlour')
+    plain = Item('teacup', location=room)
+    heirloom = Heirloom('teapot', location=room)
+    event = Event('<indef-1> sat beside <indef-2>', [heirloom, plain])
+    assert str(event) == 'A certain teapot sat beside a teacup.', str(event)
+    # and the forms are worked out afresh when the name changes
+    heirloom.name = 'samovar'
+    assert str(event) == 'A certain samovar sat beside a teacup.', str(event)
+
+
+def check_filtered_subscription():
+    from swallows.engine.events import EventSink
+    from swallows.engine.objects import Weapon
+    sink = EventSink()
+    everything = EventSink()
+    publisher = quiet_publisher(subscriptions=[
+        (sink, dict(kind=Weapon)), (everything, {}),
+    ])
+    publisher.publish()
+    assert sink.events, "the filtered sink heard nothing"
+    for event in sink.events:
+        assert [p for p in event.participants if isinstance(p, Weapon)], \
+            "%s has no Weapon in it" % event
+    assert len(sink.events) < len(everything.events)
+    # and the filtered part is just that part of the whole, in order
+    wanted = [e for e in everything.events
+              if [p for p in e.participants if isinstance(p, Weapon)]]
+    assert sink.events == wanted
+
+
+def check_publisher_options():
+    # incompatible options are refused with a ValueError (which, unlike
+    # an assert, python -O doesn't take away)
+    from swallows.engine.crowd import Crowd
+    from swallows.story.world import house
+    for options in (
+        dict(belief_capacity=0),
+        dict(repetition_policy='shuffle'),
+        dict(coroutines=True, checkpoint_interval=50),
+        dict(crowds=[Crowd(house, 2)], checkpoint_interval=50),
+    ):
+        try:
+            quiet_publisher(**options)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('%r was accepted' % (options,))
+
+
+def check_world_definition():
+    import json
+    from swallows.engine.worlds import compile_world, build_world
+    f = open(join(HERE, '..', 'eg', 'the_swallows.json'))
+    definition = json.load(f)
+    f.close()
+    world = build_world(compile_world(definition))
+    assert [c.name for c in world.characters] == ['Alice', 'Bob']
+    assert world['study'] in world['upstairs hall'].exits
+
+    # everything wrong with a definition is reported, all at once
+    definition['characters'][0]['owner'] = 'Bob'
+    definition['items'][0]['enter'] = 'crept into'
+    definition['locations'].append({'name': 'attic', 'exits': ['study']})
+    definition['locations'].append({'name': 'cellar', 'exits': []})
+    definition['setting'] = ['kitchen', 'cellar']
+    try:
+        compile_world(definition)
+    except ValueError as e:
+        problems = str(e).split('\n')[1:]
+    else:
+        raise AssertionError('bad definition was accepted')
+    for expected in (
+        "a FemaleCharacter cannot be given owner",
+        "a Treasure cannot be given enter",
+        "'attic': cannot be reached from 'kitchen'",
+        "'cellar': cannot be reached from 'kitchen'",
+        "'cellar': is in the setting, but 'kitchen' cannot be reached",
+    ):
+        assert [p for p in problems if expected in p], \
+            "no problem like %r in %r" % (expected, problems)
+    assert len(problems) == 5, problems
+
+
+def check_router():
+    # the router's answers, kept up to date as exits come and go, are the
+    # same as a breadth-first search over the exits makes afresh
+    import random
+    from collections import deque
+    from swallows.engine.objects import Location
+    from swallows.engine.routing import router
+
+    rng = random.Random(SEED)
+    rooms = [Location('room %d' % n) for n in xrange(30)]
+
+    def distances_to(destination):
+        entrances = dict([(room, []) for room in rooms])
+        for room in rooms:
+            for exit in room.exits:
+                entrances[exit].append(room)
+        distance = {destination: 0}
+        queue = deque([destination])
+        while queue:
+            here = queue.popleft()
+            for there in entrances[here]:
+                if there not in distance:
+                    distance[there] = distance[here] + 1
+                    queue.append(there)
+        return distance
+
+    def check_routes():
+        for destination in rooms:
+            expected = distances_to(destination)
+            for room in rooms:
+                assert router.distance(room, destination) == expected.get(room)
+                step = router.next_step(room, destination)
+                if room is destination or room not in expected:
+                    assert step is None
+                else:
+                    assert step in room.exits
+                    assert expected[step] == expected[room] - 1
+
+    for room in rooms:
+        room.set_exits(*rng.sample(rooms, 2))
+    check_routes()
+    for n in xrange(40):
+        room = rng.choice(rooms)
+        if rng.random() < 0.5:
+            room.add_exits(rng.choice(rooms))
+        else:
+            room.set_exits(*rng.sample(rooms, rng.randint(0, 2)))
+        check_routes()
+
+
+def check_eviction_policies():
+    from swallows.engine.objects import (
+        BoundedBeliefSet, ItemLocation, LeastRecentlyRecalled,
+        OldestInformant, Item, Location, Male,
+    )
+    room = Location('room')
+    teller = Male('Teller')
+    things = [Item('thing %d' % n, location=room) for n in xrange(4)]
+
+    def remembered(beliefs):
+        return [thing for thing in things
+                if beliefs.get(ItemLocation(thing)) is not None]
+
+    evicted = []
+    beliefs = BoundedBeliefSet(3, policy=LeastRecentlyRecalled,
+                               on_evict=evicted.append)
+    for thing in things[:3]:
+        beliefs.add(ItemLocation(thing, room))
+    beliefs.get(ItemLocation(things[0]))    # recalling it keeps it fresh
+    beliefs.add(ItemLocation(things[3], room))
+    assert [b.subject for b in evicted] == [things[1]], evicted
+    assert beliefs.evictions == 1
+    assert remembered(beliefs) == [things[0], things[2], things[3]]
+
+    beliefs = BoundedBeliefSet(3, policy=OldestInformant)
+    beliefs.add(ItemLocation(things[0], room))
+    beliefs.add(ItemLocation(things[1], room, informant=teller))
+    beliefs.add(ItemLocation(things[2], room))
+    beliefs.add(ItemLocation(things[3], room))
+    # hearsay goes first, however recently we heard it
+    assert remembered(beliefs) == [things[0], things[2], things[3]]
+    beliefs.add(ItemLocation(things[1], room))
+    assert remembered(beliefs) == [things[1], things[2], things[3]]
+
+    # what we think others believe is bounded too
+    copy = beliefs.copy()
+    assert copy.size == 3 and remembered(copy) == remembered(beliefs)
+    assert beliefs.spawn().capacity == 3
+
+
+def check_event_index():
+    from swallows.engine.query import EventIndex
+    from swallows.story.world import alice, bob, revolver, kitchen
+    publisher = quiet_publisher()
+    events = publisher.simulate_chapter(1).events
+    index = EventIndex(events)
+    assert len(index) == len(events)
+    phrase = events[10].phrase
+    for criteria in (
+        dict(initiator=alice),
+        dict(participants=(bob, revolver)),
+        dict(location=kitchen),
+        dict(phrase=phrase),
+        dict(initiator=bob, location=kitchen),
+        dict(speaker=alice, addressed_to=bob),
+        dict(exciting=True),
+        dict(exciting=False, initiator=alice),
+        {},
+    ):
+        def matches(event):
+            for (name, value) in criteria.items():
+                if name == 'participants':
+                    if [p for p in value if p not in event.participants]:
+                        return False
+                elif name == 'initiator':
+                    if event.initiator() is not value:
+                        return False
+                elif name == 'exciting':
+                    if bool(event.exciting) != value:
+                        return False
+                elif name == 'phrase':
+                    if event.phrase != value:
+                        return False
+                elif getattr(event, name) is not value:
+                    return False
+            return True
+        expected = [n for (n, event) in enumerate(events) if matches(event)]
+        assert index.positions(**criteria) == expected, criteria
+        assert index.select(**criteria) == [events[n] for n in expected]
+    # events are found by what they were when they were indexed
+    events[10].phrase = 'something else entirely'
+    assert 10 in index.positions(phrase=phrase)
+
+
+def check_registry_snapshot():
+    from swallows.engine.objects import registry
+    from swallows.story.world import (
+        alice, bob, kitchen, falcon, jewels, mailbox, cupboards,
+    )
+    alice.place_in(kitchen)
+    before = registry.snapshot()
+    data = registry.serialize(before)
+    assert registry.deserialize(data) == before
+
+    falcon.move_to(alice)
+    jewels.move_to(mailbox)
+    mailbox.owner = bob
+    assert registry.holder(falcon) is alice
+    assert registry.root(falcon) is kitchen
+    assert falcon in registry.treasures_under(alice)
+    after = registry.snapshot()
+    assert registry.diff(before, after) == sorted(
+        [falcon.id, jewels.id, mailbox.id]
+    )
+    assert registry.diff(after, registry.deserialize(registry.serialize(after))) == []
+
+    registry.restore(before)
+    assert registry.diff(before, registry.snapshot()) == []
+    assert falcon.location is not alice and falcon not in alice.contents
+    assert registry.holder(falcon) is None
+    assert registry.treasures_under(alice) == ()
+    assert mailbox.owner is None and mailbox not in registry.owned_by(bob)
+    assert jewels not in mailbox.contents
+    assert cupboards in kitchen.contents
+
+
+def check_suppress_repetition():
+    from swallows.engine.event import Event
+    from swallows.engine.events import SuppressRepetitionTransformer
+    from swallows.engine.objects import Location, Male
+    room = Location('room')
+    bob = Male('Bob')
+    alice = Male('Al')
+    bob.place_in(room)
+    alice.place_in(room)
+
+    def story(policy, phrases, window=50):
+        transformer = SuppressRepetitionTransformer(window=window, policy=policy)
+        return [str(e) for e in transformer.transform(
+            None, [Event(phrase, [bob, alice]) for phrase in phrases], 1
+        )]
+
+    phrases = ['<1> looked at <2>', '<1> sighed', '<1> looked at <2>',
+               '<1> looked at <2>', "<1> said, 'Well'", "<1> said, 'Well'"]
+    assert story('drop', phrases) == [
+        'Bob looked at Al.', 'Bob sighed.', "Bob said, 'Well'.",
+    ]
+    assert story('vary', phrases) == [
+        'Bob looked at Al.', 'Bob sighed.', 'Bob looked at Al again.',
+        'Bob looked at Al yet again.', "Bob said, 'Well'.",
+        "Bob said, 'Well, again'.",
+    ], story('vary', phrases)
+    # (a line of dialogue can't be said "more than once", so it's varied)
+    assert story('collapse', phrases) == [
+        'Bob looked at Al, more than once.', 'Bob sighed.',
+        "Bob said, 'Well'.", "Bob said, 'Well, again'.",
+    ], story('collapse', phrases)
+    # only the last `window` events count
+    assert story('drop', phrases[:3], window=1) == [
+        'Bob looked at Al.', 'Bob sighed.', 'Bob looked at Al.',
+    ]
+    # and moving about is never touched
+    assert story('drop', ['<1> went to <2>'] * 2) == ['Bob went to Al.'] * 2
+
+
+def check_event_bus():
+    from swallows.engine.event import Event, EventSink
+    from swallows.engine.events import EventBus
+    from swallows.engine.objects import Location, Male, Weapon
+    room = Location('room')
+    hall = Location('hall')
+    bob = Male('Bob')
+    alice = Male('Al')
+    bob.place_in(room)
+    alice.place_in(hall)
+    gun = Weapon('gun', location=room)
+
+    bus = EventBus()
+    sinks = dict([(name, EventSink()) for name in
+                  ('phrase', 'initiator', 'kind', 'location', 'predicate')])
+    bus.subscribe(sinks['phrase'], phrase=['<1> sighed', '<1> took <2>'])
+    bus.subscribe(sinks['initiator'], initiator=alice)
+    bus.subscribe(sinks['kind'], kind=Weapon)
+    bus.subscribe(sinks['location'], location=room)
+    predicate = bus.subscribe(sinks['predicate'],
+                              predicate=lambda e: len(e.participants) > 1)
+
+    def emit(phrase, participants):
+        if bus.wants(phrase, participants):
+            bus.collect(Event(phrase, participants))
+
+    emit('<1> sighed', [bob])
+    emit('<1> took <2>', [bob, gun])
+    emit('<1> looked at <2>', [alice, bob])
+    bus.unsubscribe(predicate)
+    emit('<1> waved at <2>', [alice, bob])
+    heard = dict([(name, [str(e) for e in sink.events])
+                  for (name, sink) in sinks.items()])
+    assert heard == {
+        'phrase': ['Bob sighed.', 'Bob took the gun.'],
+        'initiator': ['Al looked at Bob.', 'Al waved at Bob.'],
+        'kind': ['Bob took the gun.'],
+        'location': ['Bob sighed.', 'Bob took the gun.'],
+        'predicate': ['Bob took the gun.', 'Al looked at Bob.'],
+    }, heard
+    # and if nobody wants to hear about something, it's never made
+    carl = Male('Carl')
+    carl.place_in(hall)
+    assert not bus.wants('<1> sneezed', [carl])
+
+
+def check_crowd():
+    from swallows.engine.crowd import Crowd
+    from swallows.engine.event import EventCollector
+    from swallows.engine.objects import Location, Male
+    rooms = [Location('room %d' % n) for n in xrange(5)]
+    for (n, room) in enumerate(rooms):
+        room.set_exits(rooms[(n + 1) % 5], rooms[n - 1])
+    watcher = Male('Watcher')
+    watcher.place_in(rooms[0])
+    crowd = Crowd(rooms, 50, seed=SEED)
+    crowd.begin_chapter(EventCollector(), [watcher])
+    for n in xrange(20):
+        crowd.tick([watcher])
+        # the extras made flesh are just the ones where the watcher is
+        assert crowd.present == crowd.extras_in(set([0]))
+        for n in crowd.present:
+            assert crowd.extras[n].location is rooms[0]
+        for n in set(crowd.extras) - crowd.present:
+            assert crowd.extras[n].location is None
+        # and everyone moves only along the exits
+        for (p, q) in zip(crowd.previous, crowd.positions):
+            assert (q - p) % 5 in (0, 1, 4)
+    watcher.move_to(rooms[2])
+    crowd.follow([watcher])
+    assert crowd.present == crowd.extras_in(set([2]))
+    crowd.end_chapter()
+    assert not crowd.present
+    assert len(set([e.name for e in crowd.extras.values()])) == len(crowd.extras)
+
+
+def check_exporter():
+    import os
+    import sqlite3
+    import tempfile
+    from swallows.engine.event import EventSink
+    from swallows.engine.export import SQLiteExporter
+    (fd, path) = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        everything = EventSink()
+        publisher = quiet_publisher(exporter=SQLiteExporter(path),
+                                    subscriptions=[(everything, {})])
+        publisher.publish()
+        db = sqlite3.connect(path)
+        def count(query):
+            return db.execute(query).fetchone()[0]
+        assert count("SELECT COUNT(*) FROM chapters") == CHAPTERS
+        assert count("SELECT COUNT(*) FROM events") == len(everything.events)
+        assert count("SELECT COUNT(*) FROM participants") == sum(
+            [len(e.participants) for e in everything.events]
+        )
+        assert count("SELECT COUNT(*) FROM sentences WHERE text = ''") == 0
+        # each event's sentence, if it made it into one, is in its chapter
+        assert count("""SELECT COUNT(*) FROM events e JOIN sentences s
+                        ON e.sentence_id = s.id
+                        WHERE e.chapter_id != s.chapter_id""") == 0
+        assert count("SELECT COUNT(*) FROM events WHERE sentence_id IS NOT NULL") > 0
+        assert count("SELECT COUNT(*) FROM beliefs") > 0
+        db.close()
+    finally:
+        os.unlink(path)
+
+CHECKS = [
+    name[len('check_'):] for name in sorted(globals())
+    if name.startswith('check_')
+]
+
+
+def run_check(name):
+    """Run the named check in a process of its own, and return whatever it
+    printed to stderr if it failed, or None if it didn't.
+
+    """
+    process = subprocess.Popen(
+        [sys.executable, realpath(sys.argv[0]), '--run', name],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    (out, err) = process.communicate()
+    if process.returncode != 0:
+        return err
+    return None
+
+### main ###
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        globals()['check_' + sys.argv[2]]()
+        sys.exit(0)
+
+    names = sys.argv[1:] or CHECKS
+    failed = []
+    for name in names:
+        if name not in CHECKS:
+            print "%s: no such check" % name
+            failed.append(name)
+            continue
+        err = run_check(name)
+        if err is None:
+            print "%s: ok" % name
+        else:
+            print "%s: FAILED" % name
+            for line in err.strip().split('\n')[-3:]:
+                print '  ' + line
+            failed.append(name)
+
+    if failed:
+        print "FAILED: %s" % ', '.join(failed)
+        sys.exit(1)
+    print "all ok"
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+#
+# golden.py: check that the novel generator still writes exactly what it
+# used to, and is still at least as fast as it should be.
+#
+# usage:
+#   golden.py [--update] [--runs N] [--budget-scale F] [SCENARIO ...]
+#       generate a few fixed-seed chapters of each scenario (or just the
+#       ones named), compare them byte for byte with the golden copies in
+#       script/golden/, and check events/sec (simulating) and
+#       paragraphs/sec (editing) against each scenario's budget.  exits
+#       with status 1 if anything differs or is too slow.
+#
+#       --update writes the goldens afresh instead of comparing against
+#       them (but still checks the budgets.)  --runs N takes the best
+#       throughput of N runs (default 3.)  --budget-scale F multiplies every budget
+#       by F, for slower (or faster) machines; 0 turns them off.
+#
+
+from os.path import realpath, dirname, join, exists
+from optparse import OptionParser
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = dirname(realpath(sys.argv[0]))
+ROOT = join(HERE, '..')
+GOLDEN_DIR = join(HERE, 'golden')
+
+# get the ../src/ directory onto the Python module search path
+sys.path.insert(0, join(ROOT, 'src'))
+
+# the goldens were made with these; change them, and they all need making
+# again (with --update.)
+SEED = 1
+CHAPTERS = 3
+
+# (name, script, options, minimum events/sec, minimum paragraphs/sec).
+# options are given to the script's Publisher, over whatever it gives it,
+# so that the paths the stock scripts don't take get run too.  the
+# budgets are about a third of the best of 3 runs on one core of a
+# modest server, as timings this short are noisy; only a real slowdown
+# should trip them.  (a budget of 0 is no budget at all; with a
+# word_target, for instance, paragraphs/sec means nothing.)
+SCENARIOS = [
+    ('the_swallows', join(ROOT, 'script', 'the_swallows.py'), {}, 15000, 600),
+    ('not_the_swallows', join(ROOT, 'eg', 'not_the_swallows.py'), {}, 25000, 600),
+    ('the_swallows++', join(ROOT, 'eg', 'the_swallows++.py'), {}, 15000, 600),
+    ('repetition_vary', join(ROOT, 'script', 'the_swallows.py'),
+     {'repetition_window': 50, 'repetition_policy': 'vary'}, 15000, 500),
+    ('repetition_collapse', join(ROOT, 'script', 'the_swallows.py'),
+     {'repetition_window': 50, 'repetition_policy': 'collapse'}, 15000, 500),
+    ('repetition_drop', join(ROOT, 'script', 'the_swallows.py'),
+     {'repetition_window': 50, 'repetition_policy': 'drop'}, 15000, 500),
+    ('word_target_parallel', join(ROOT, 'script', 'the_swallows.py'),
+     {'word_target': 12000, 'edit_processes': 2}, 5000, 0),
+    ('belief_capacity', join(ROOT, 'script', 'the_swallows.py'),
+     {'belief_capacity': 6}, 13000, 500),
+    ('busy_street', join(ROOT, 'eg', 'busy_street.py'), {}, 20000, 500),
+]
+
+
+def run_scenario(script, options, output_path):
+    """Run the given script, in this process, making it write its novel
+    (CHAPTERS chapters of it, from SEED, with the given options) to
+    output_path; return the number of events and paragraphs, and how long
+    it spent making each.
+
+    """
+    # the world makes some random decisions of its own while it's being
+    # set up (where the revolver is, and so on), so seed those first
+    from swallows.engine.rng import streams
+    streams.seed(SEED)
+
+    import swallows.engine.events
+    from swallows.engine.events import Publisher
+    from swallows.engine.writers import Writer, MarkdownWriter
+
+    stats = {
+        'events': 0, 'simulate_time': 0.0,
+        'paragraphs': 0, 'edit_time': 0.0,
+    }
+
+    class ParagraphCounter(Writer):
+        def paragraph(self, editor, paragraph_num, events, sentences):
+            stats['paragraphs'] += 1
+
+    output = open(output_path, 'w')
+
+    class GoldenPublisher(Publisher):
+        def __init__(self, *args, **kwargs):
+            kwargs['chapters'] = CHAPTERS
+            kwargs['seed'] = SEED
+            kwargs['writers'] = [MarkdownWriter(output), ParagraphCounter()]
+            kwargs.update(options)
+            Publisher.__init__(self, *args, **kwargs)
+
+        # (with a word_target, most of the editing is done while the
+        # chapter is being simulated, and counts as simulating)
+        def simulate_chapter(self, chapter_num, *args, **kwargs):
+            start = time.time()
+            collector = Publisher.simulate_chapter(self, chapter_num,
+                                                   *args, **kwargs)
+            stats['simulate_time'] += time.time() - start
+            stats['events'] += len(collector.events)
+            return collector
+
+        def finish_editing(self, editor):
+            start = time.time()
+            Publisher.finish_editing(self, editor)
+            stats['edit_time'] += time.time() - start
+
+    # the scripts do "from swallows.engine.events import Publisher", so
+    # they get this one
+    swallows.engine.events.Publisher = GoldenPublisher
+    sys.argv = [script]
+    runpy.run_path(script, run_name='__main__')
+    output.close()
+    return stats
+
+
+def spawn_scenario(name, output_path):
+    """Run the named scenario in a process of its own (each world lives in
+    module globals, so there can only be one per process) and return its
+    stats.
+
+    """
+    process = subprocess.Popen(
+        [sys.executable, realpath(sys.argv[0]), '--run', name, output_path],
+        stdout=subprocess.PIPE
+    )
+    (out, err) = process.communicate()
+    if process.returncode != 0:
+        return None
+    return json.loads(out)
+
+
+def read(path):
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    return data
+
+
+def first_difference(a, b):
+    """Return the line number, and the two lines, where a and b first
+    differ.
+
+    """
+    a_lines = a.split('\n')
+    b_lines = b.split('\n')
+    for n in xrange(max(len(a_lines), len(b_lines))):
+        a_line = a_lines[n] if n < len(a_lines) else '<end of file>'
+        b_line = b_lines[n] if n < len(b_lines) else '<end of file>'
+        if a_line != b_line:
+            return (n + 1, a_line, b_line)
+    return None
+
+
+def check_scenario(name, min_events, min_paragraphs, options, temp_dir):
+    golden_path = join(GOLDEN_DIR, name + '.md')
+    ok = True
+    best = None
+    for run in xrange(options.runs):
+        output_path = join(temp_dir, '%s.%d.md' % (name, run))
+        stats = spawn_scenario(name, output_path)
+        if stats is None:
+            print "%s: FAILED (see above)" % name
+            return False
+        output = read(output_path)
+        # (with --update, any later runs are checked against the first,
+        # which at least shows the output doesn't change from run to run)
+        if options.update and run == 0:
+            shutil.copyfile(output_path, golden_path)
+            print "%s: wrote %s" % (name, golden_path)
+        elif not exists(golden_path):
+            print "%s: no golden output (run with --update to make one)" % name
+            return False
+        elif output != read(golden_path):
+            (line, expected, got) = first_difference(read(golden_path), output)
+            print "%s: output DIFFERS from golden, at line %d" % (name, line)
+            print "  expected: %s" % expected[:200]
+            print "  got:      %s" % got[:200]
+            return False
+        events_rate = stats['events'] / max(stats['simulate_time'], 1e-6)
+        paragraphs_rate = stats['paragraphs'] / max(stats['edit_time'], 1e-6)
+        if best is None:
+            best = [events_rate, paragraphs_rate]
+        else:
+            best = [max(best[0], events_rate), max(best[1], paragraphs_rate)]
+    if not options.update and ok:
+        print "%s: output matches golden" % name
+    for (what, rate, budget) in (
+        ('events/sec', best[0], min_events * options.budget_scale),
+        ('paragraphs/sec', best[1], min_paragraphs * options.budget_scale),
+    ):
+        verdict = 'ok'
+        if rate < budget:
+            verdict = 'TOO SLOW'
+            ok = False
+        print "  %-15s %9.0f  (budget %6.0f)  %s" % (what, rate, budget, verdict)
+    return ok
+
+### main ###
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('--update', action='store_true', default=False)
+    parser.add_option('--runs', type='int', default=3)
+    parser.add_option('--budget-scale', type='float', default=1.0)
+    parser.add_option('--run', action='store_true', default=False,
+                      help='(internal) run one scenario in this process')
+    (options, args) = parser.parse_args()
+
+    scripts = dict([(name, (script, publisher_options))
+                    for (name, script, publisher_options, e, p) in SCENARIOS])
+
+    if options.run:
+        (name, output_path) = args
+        (script, publisher_options) = scripts[name]
+        print json.dumps(run_scenario(script, publisher_options, output_path))
+        sys.exit(0)
+
+    for name in args:
+        if name not in scripts:
+            parser.error('no such scenario: %s (try one of: %s)' % (
+                name, ', '.join(sorted(scripts))
+            ))
+    if not exists(GOLDEN_DIR):
+        os.makedirs(GOLDEN_DIR)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        failed = []
+        for (name, script, publisher_options, min_events, min_paragraphs) in SCENARIOS:
+            if args and name not in args:
+                continue
+            if not check_scenario(name, min_events, min_paragraphs,
+                                  options, temp_dir):
+                failed.append(name)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    if failed:
+        print "FAILED: %s" % ', '.join(failed)
+        sys.exit(1)
+    print "all ok"
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+#
+# import_check.py: check that every module under src/swallows can be
+# imported first thing, in a fresh interpreter -- i.e. that there are no
+# import cycles which only work out if some other module happens to have
+# been imported before.
+#
+# usage:
+#   import_check.py [MODULE ...]
+#       import each of the named modules (or every one there is), each in a
+#       process of its own.  exits with status 1 if any of them fail.
+#
+
+from os.path import realpath, dirname, join
+import os
+import subprocess
+import sys
+
+HERE = dirname(realpath(sys.argv[0]))
+SRC = join(HERE, '..', 'src')
+
+
+def all_modules():
+    modules = []
+    for (dirpath, dirnames, filenames) in os.walk(join(SRC, 'swallows')):
+        dirnames.sort()
+        package = os.path.relpath(dirpath, SRC).replace(os.sep, '.')
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            if filename == '__init__.py':
+                modules.append(package)
+            else:
+                modules.append('%s.%s' % (package, filename[:-3]))
+    return modules
+
+
+def check_module(name):
+    """Import the named module in a process of its own, and return
+    whatever it printed to stderr if that failed, or None if it didn't.
+
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = SRC
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'import %s' % name],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env
+    )
+    (out, err) = process.communicate()
+    if process.returncode != 0:
+        return err
+    return None
+
+### main ###
+
+if __name__ == '__main__':
+    modules = sys.argv[1:] or all_modules()
+    failed = []
+    for name in modules:
+        err = check_module(name)
+        if err is None:
+            print "%s: ok" % name
+        else:
+            print "%s: FAILED" % name
+            print '  ' + err.strip().split('\n')[-1]
+            failed.append(name)
+
+    if failed:
+        print "FAILED: %s" % ', '.join(failed)
+        sys.exit(1)
+    print "all ok"
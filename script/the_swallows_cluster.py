@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#
+# the_swallows_cluster.py: the novel generator, spread across workers.
+#
+# usage:
+#   the_swallows_cluster.py [--novels N] [--chapters N] [--seed S]
+#                           [--world-seed S] [--workers N] [--port P]
+#                           [--output-dir DIR]
+#       start a coordinator, and (unless --workers 0) that many local
+#       worker processes; write each novel to DIR/novel-N.md, or stdout
+#   the_swallows_cluster.py --worker HOST:PORT [--world-seed S]
+#       run a worker for a coordinator started elsewhere (with the same
+#       --world-seed as the coordinator)
+#
+
+from os.path import realpath, dirname, join
+from optparse import OptionParser
+import subprocess
+import sys
+
+# get the ../src/ directory onto the Python module search path
+sys.path.insert(0, join(dirname(realpath(sys.argv[0])), '..', 'src'))
+
+parser = OptionParser()
+parser.add_option('--novels', type='int', default=1)
+parser.add_option('--chapters', type='int', default=18)
+parser.add_option('--seed', type='int', default=0)
+parser.add_option('--world-seed', type='int', default=0)
+parser.add_option('--workers', type='int', default=4)
+parser.add_option('--port', type='int', default=0)
+parser.add_option('--retries', type='int', default=3)
+parser.add_option('--output-dir', default=None)
+parser.add_option('--worker', default=None, metavar='HOST:PORT')
+(options, args) = parser.parse_args()
+
+# the world makes some random decisions of its own while it's being set
+# up, and every worker has to set it up the same way.
+from swallows.engine.rng import streams
+streams.seed(options.world_seed)
+
+from swallows.engine.events import Publisher
+from swallows.engine.distributed import Coordinator, run_worker
+from swallows.story.world import alice, bob, house
+
+
+def make_publisher(novel, seed, writers):
+    return Publisher(
+        characters=(alice, bob),
+        setting=house,
+        title="Dial S for Swallows",
+        friffery=True,
+        seed=seed,
+        writers=writers,
+    )
+
+### main ###
+
+if options.worker:
+    (host, port) = options.worker.rsplit(':', 1)
+    run_worker((host, int(port)), make_publisher)
+    sys.exit(0)
+
+novels = [('novel-%d' % (n + 1), options.chapters, options.seed + n)
+          for n in xrange(options.novels)]
+coordinator = Coordinator(novels, port=options.port, retries=options.retries)
+(host, port) = coordinator.address
+sys.stderr.write("coordinator listening on %s:%d\n" % (host, port))
+workers = [
+    subprocess.Popen([sys.executable, realpath(sys.argv[0]),
+                      '--worker', '%s:%d' % (host, port),
+                      '--world-seed', str(options.world_seed)])
+    for n in xrange(options.workers)
+]
+ok = coordinator.run()
+for worker in workers:
+    worker.wait()
+
+for name in coordinator.novels:
+    if options.output_dir:
+        f = open(join(options.output_dir, '%s.md' % name), 'w')
+        missing = coordinator.write_novel(name, f)
+        f.close()
+    else:
+        missing = coordinator.write_novel(name, sys.stdout)
+    for chapter_num in missing:
+        sys.stderr.write("%s chapter %d is MISSING\n" % (name, chapter_num))
+for (novel, chapter_num, worker, attempt, seconds) in coordinator.timings():
+    sys.stderr.write("%s chapter %d: %.2fs on %s (attempt %d)\n" % (
+        novel, chapter_num, seconds, worker, attempt
+    ))
+for ((novel, chapter_num), error) in sorted(coordinator.failures.items()):
+    sys.stderr.write("%s chapter %d FAILED:\n%s\n" % (novel, chapter_num, error))
+sys.exit(0 if ok else 1)
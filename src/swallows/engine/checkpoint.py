@@ -0,0 +1,101 @@
+from swallows.engine.event import EventCollector
+from swallows.engine.objects import registry
+
+### CHECKPOINTS ###
+
+class Checkpoint(object):
+    """The state of the world and of every character's mind, taken between
+    two turns of a chapter.  Cheap to take: the world is a copy of the
+    registry's arrays, and beliefs are mostly shared BeliefGroups.
+
+    """
+    def __init__(self, turn, event_count, characters):
+        self.turn = turn                # the number of turns taken so far
+        self.event_count = event_count  # the number of events so far
+        self.world = registry.snapshot()
+        self.states = [character.get_state() for character in characters]
+
+    def restore(self, characters):
+        registry.restore(self.world)
+        for (character, state) in zip(characters, self.states):
+            character.set_state(state)
+
+
+class ChapterHistory(object):
+    """The event log of a chapter, along with a Checkpoint taken every
+    `interval` events (or as soon after as a turn ends.)
+
+    To see what things were like at some event in the chapter, seek() to
+    it: this restores the nearest checkpoint before it and replays turns
+    from there, so it takes time proportional to the interval, not to
+    how far into the chapter the event is.
+
+    Note that the events in the log are the very ones the Editor goes on
+    to rewrite, so by the time the chapter is published, their phrases may
+    have changed.  Their order and number have not.
+
+    """
+    def __init__(self, chapter_num, characters, collector, interval=100):
+        self.chapter_num = chapter_num
+        self.characters = characters
+        self.collector = collector
+        self.events = collector.events
+        self.interval = interval
+        self.checkpoints = []
+        self.next_at = 0
+
+    def tick(self, turn):
+        """Called at the start of each turn; takes a Checkpoint if one is
+        due.
+
+        """
+        if len(self.events) >= self.next_at:
+            self.checkpoints.append(
+                Checkpoint(turn, len(self.events), self.characters)
+            )
+            self.next_at = len(self.events) + self.interval
+
+    def nearest_checkpoint(self, index):
+        low = 0
+        high = len(self.checkpoints)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.checkpoints[middle].event_count <= index:
+                low = middle
+            else:
+                high = middle
+        return self.checkpoints[low]
+
+    def seek(self, index):
+        """Put the world and the characters back the way they were just
+        after the turn in which the event with the given index (into
+        self.events) happened, and return the replayed event.
+
+        The characters are left collecting into a fresh EventCollector,
+        which holds the chapter's events up to the end of that turn.
+
+        The first few events of a chapter (the characters finding
+        themselves where it starts) don't happen in any turn, and can't
+        be sought to; that raises a ValueError, as does an index out of
+        range.
+
+        """
+        if not 0 <= index < len(self.events):
+            raise ValueError('No event %d in chapter %d' % (index, self.chapter_num))
+        if index < self.checkpoints[0].event_count:
+            raise ValueError('Event %d of chapter %d happened before the first turn' % (
+                index, self.chapter_num
+            ))
+        checkpoint = self.nearest_checkpoint(index)
+        checkpoint.restore(self.characters)
+        collector = EventCollector()
+        collector.events = self.events[:checkpoint.event_count]
+        for character in self.characters:
+            character.collector = collector
+        turn = checkpoint.turn
+        while len(collector.events) <= index:
+            self.characters[turn % len(self.characters)].live()
+            turn += 1
+        event = collector.events[index]
+        assert event.initiator() is self.events[index].initiator()
+        return event
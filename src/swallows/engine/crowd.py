@@ -0,0 +1,298 @@
+from array import array
+import itertools
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from swallows.engine.objects import (
+    Animate, ProperMixin, MasculineMixin, FeminineMixin, registry
+)
+
+### CROWDS ###
+
+# a busy street wants hundreds of people on it, but not hundreds of
+# Animates each taking a turn, emitting events and shuffling themselves
+# between contents sets.  a Crowd keeps just the position of each of its
+# extras, as an index into a compiled form of the map, and moves all of
+# them at once each tick.  an extra only turns into an actual Animate
+# (an Extra) while it is somewhere one of the main characters is, and so
+# somewhere something it does might be written about.
+
+
+class Extra(ProperMixin, Animate):
+    """A member of a Crowd, made flesh for as long as a main character is
+    around to see them.  They don't decide anything for themselves; the
+    Crowd moves them.
+
+    """
+    __slots__ = ()
+
+    def live(self):
+        pass
+
+    def watches(self, other):
+        # extras don't remark on each other coming and going, only on the
+        # main characters
+        return not isinstance(other, Extra)
+
+    def place_in(self, location):
+        # just say we're here; an extra doesn't remark on everyone (and
+        # everything) else in the room, or there'd be nothing else written
+        if self.location is not None:
+            self.location.contents.remove(self)
+        self.location = location
+        self.location.contents.add(self)
+        registry.relocated(self)
+        self.emit("<1> <was-1> in <2>", [self, self.location])
+
+
+class MaleExtra(MasculineMixin, Extra):
+    __slots__ = ()
+
+
+class FemaleExtra(FeminineMixin, Extra):
+    __slots__ = ()
+
+
+# the names extras get, unless their Crowd has a factory of its own.  each
+# extra made gets the next name, so no two extras (in any crowd) share one.
+FEMALE_NAMES = ('Agnes', 'Beatrice', 'Clara', 'Dorothy',
+                'Edith', 'Florence', 'Gwendolyn', 'Harriet')
+MALE_NAMES = ('Albert', 'Bertram', 'Cyril', 'Desmond',
+              'Edmund', 'Frederick', 'Gilbert', 'Horace')
+SURNAMES = ('Abbott', 'Barnes', 'Crawley', 'Dunmore', 'Ellery',
+            'Fairweather', 'Griggs', 'Hollis', 'Ingram', 'Jessop')
+extras_named = itertools.count()
+
+
+def make_extra(n):
+    """Make a new Extra (of either sex, alternately) with a name nobody
+    else has.  (n, the extra's number in its crowd, isn't needed for this.)
+
+    """
+    k = next(extras_named)
+    (class_, given_names) = ((FemaleExtra, FEMALE_NAMES),
+                             (MaleExtra, MALE_NAMES))[k % 2]
+    # the given name goes round every 16, and the surname every 10, but
+    # shifted along one each time the given names go round, so it takes
+    # 160 extras before a name comes back
+    first = given_names[(k // 2) % len(given_names)]
+    cycle = k // (2 * len(given_names))
+    last = SURNAMES[(k + cycle) % len(SURNAMES)]
+    name = '%s %s' % (first, last)
+    if k >= 2 * len(given_names) * len(SURNAMES):
+        name = '%s #%d' % (name, k // (2 * len(given_names) * len(SURNAMES)) + 1)
+    return class_(name)
+
+
+class Crowd(object):
+    """size extras, wandering at random around the given locations.  Each
+    tick, each extra takes a random exit with probability mobility (only
+    exits to other locations among the given ones count.)
+
+    The map is compiled into CSR form: the exits of location i are
+    targets[offsets[i]:offsets[i] + degree[i]].  If the exits change after
+    the Crowd is made, call compile() again.
+
+    With use_numpy, positions are a NumPy array and a tick is a handful of
+    array operations, however big the crowd; without it, the same thing
+    is done with array.array and a loop.  (The two make different random
+    choices from the same seed.)
+
+    factory(n) makes the Animate for extra number n, the first time it is
+    needed; by default, a MaleExtra or FemaleExtra with a name of their
+    own (see make_extra).  Extras need names that tell them apart, or two
+    of them doing the same thing one after the other looks like a
+    duplicate event.  name is the crowd's own, which (among other things)
+    its random choices are seeded from.
+
+    """
+    def __init__(self, locations, size, name='passer-by', mobility=0.5,
+                 factory=None, seed=None, use_numpy=False):
+        if use_numpy and numpy is None:
+            raise ImportError("use_numpy requires NumPy to be installed")
+        self.locations = tuple(locations)
+        self.size = size
+        self.name = name
+        self.mobility = mobility
+        if factory is None:
+            factory = make_extra
+        self.factory = factory
+        self.use_numpy = use_numpy
+        self.extras = {}        # n -> Animate, once made
+        self.present = set()    # the n's of the extras that are made flesh
+        self.occupied = None    # where the characters were, when last synced
+        self.collector = None
+        self.compile()
+        self.seed(seed)
+
+    def compile(self):
+        self.index = dict([(location, i) for (i, location) in enumerate(self.locations)])
+        offsets = []
+        degree = []
+        targets = []
+        for location in self.locations:
+            offsets.append(len(targets))
+            exits = [self.index[exit] for exit in location.exits
+                     if exit in self.index]
+            degree.append(len(exits))
+            targets.extend(exits)
+        if self.use_numpy:
+            self.offsets = numpy.array(offsets, dtype=numpy.intp)
+            self.degree = numpy.array(degree, dtype=numpy.intp)
+            self.targets = numpy.array(targets, dtype=numpy.intp)
+        else:
+            self.offsets = array('l', offsets)
+            self.degree = array('l', degree)
+            self.targets = array('l', targets)
+
+    def seed(self, seed=None):
+        """Reseed, and scatter the extras at random over the locations."""
+        count = len(self.locations)
+        if self.use_numpy:
+            self.random = numpy.random.RandomState(seed)
+            self.positions = self.random.randint(0, count, self.size).astype(numpy.intp)
+            self.previous = self.positions.copy()
+        else:
+            self.random = random.Random(seed)
+            r = self.random.random
+            self.positions = array('l', [int(r() * count) for n in xrange(self.size)])
+            self.previous = self.positions[:]
+
+    def step(self):
+        """Move everyone in the crowd."""
+        if self.use_numpy:
+            positions = self.positions
+            self.previous = positions.copy()
+            degree = self.degree[positions]
+            moving = (degree > 0) & (self.random.random_sample(self.size) < self.mobility)
+            choices = self.offsets[positions] + (
+                self.random.random_sample(self.size) * degree
+            ).astype(numpy.intp)
+            positions[moving] = self.targets[choices[moving]]
+        else:
+            positions = self.positions
+            self.previous = positions[:]
+            offsets = self.offsets
+            degree = self.degree
+            targets = self.targets
+            mobility = self.mobility
+            r = self.random.random
+            for n in xrange(self.size):
+                here = positions[n]
+                d = degree[here]
+                if d and r() < mobility:
+                    positions[n] = targets[offsets[here] + int(r() * d)]
+
+    def watched(self, characters):
+        """Return the indices of the locations where the characters are."""
+        occupied = set()
+        for character in characters:
+            i = self.index.get(character.location)
+            if i is not None:
+                occupied.add(i)
+        return occupied
+
+    def extras_in(self, occupied):
+        """Return the set of the n's of the extras in the given locations."""
+        if not occupied:
+            return set()
+        if self.use_numpy:
+            return set(numpy.nonzero(
+                numpy.in1d(self.positions, list(occupied))
+            )[0].tolist())
+        return set([n for (n, i) in enumerate(self.positions) if i in occupied])
+
+    def begin_chapter(self, collector, characters):
+        """Called once the characters are in place at the start of a
+        chapter.
+
+        """
+        self.collector = collector
+        for extra in self.extras.itervalues():
+            extra.collector = collector
+        self.previous = self.positions[:] if not self.use_numpy else self.positions.copy()
+        self.sync(characters)
+
+    def end_chapter(self):
+        for n in list(self.present):
+            self.vanish(n)
+
+    def sync(self, characters):
+        """Make flesh the extras where the characters are, and let go of the
+        ones that aren't any more.  Anyone who walked into (or out of) a
+        watched location since the last step is seen to do it.
+
+        """
+        self.occupied = self.watched(characters)
+        present = self.extras_in(self.occupied)
+        for n in sorted(self.present):
+            extra = self.extras[n]
+            location = self.locations[self.positions[n]]
+            if extra.location is not location:
+                extra.move_to(location)
+            if n not in present:
+                self.vanish(n)
+        for n in sorted(present - self.present):
+            extra = self.extras.get(n)
+            if extra is None:
+                extra = self.factory(n)
+                extra.collector = self.collector
+                self.extras[n] = extra
+            location = self.locations[self.positions[n]]
+            previous = self.locations[self.previous[n]]
+            self.present.add(n)
+            if previous is location:
+                extra.place_in(location)
+            else:
+                extra.location = previous
+                previous.contents.add(extra)
+                extra.move_to(location)
+        # everyone's moves since the last step have been seen now
+        self.previous = self.positions[:] if not self.use_numpy else self.positions.copy()
+
+    def follow(self, characters):
+        """Sync, if any of the characters have gone somewhere else since
+        the last time; called after each of their turns, so that they see
+        who is in a room as soon as they get there (and the extras in the
+        room they left aren't written about any more.)
+
+        """
+        if self.watched(characters) != self.occupied:
+            self.sync(characters)
+
+    def vanish(self, n):
+        """Quietly take the Animate for extra n off the map.  Anything they
+        were carrying gets left behind.
+
+        """
+        extra = self.extras[n]
+        location = extra.location
+        for thing in list(extra.contents):
+            thing.move_to(location)
+        location.contents.remove(extra)
+        extra.location = None
+        registry.relocated(extra)
+        self.present.discard(n)
+
+    def tick(self, characters):
+        self.step()
+        self.sync(characters)
+
+    def run(self, characters):
+        """The Crowd as a task for a Scheduler: one tick per tick."""
+        while True:
+            self.tick(characters)
+            yield
+
+    def following(self, characters):
+        """A task for a Scheduler that follows the characters around; one
+        of these goes after each character (see follow.)
+
+        """
+        while True:
+            self.follow(characters)
+            yield
@@ -0,0 +1,283 @@
+from Queue import Queue, Empty
+from StringIO import StringIO
+import json
+import os
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+
+from swallows.engine.rng import RandomStreams
+from swallows.engine.writers import MarkdownWriter
+
+### DISTRIBUTED PUBLISHING ###
+
+# a Coordinator hands out work units -- (novel, chapter, seed) -- to
+# Workers, which connect to it over TCP, publish the chapter, and send back
+# its text along with how long it took.  everything can run on localhost,
+# with several worker processes standing in for the machines you don't
+# have.
+#
+# the protocol is lines of JSON, one message per line:
+#
+#   worker:      {"type": "ready", "worker": name}
+#   coordinator: {"type": "unit", "novel": ..., "chapter": n, "seed": s}
+#   worker:      {"type": "result", "text": ..., "seconds": t, ...}
+#            or  {"type": "failed", "error": traceback}
+#   coordinator: another "unit", or {"type": "done"}
+#
+# a chapter normally starts from wherever the previous one left the world
+# and the characters, which would mean a worker had to write every chapter
+# before the one it was asked for.  so here, every chapter starts from the
+# world as it was set up, and gets its own seed, derived from the novel's.
+# the same seed always gives the same chapter, on any worker.
+
+
+def chapter_seed(seed, chapter_num):
+    return RandomStreams(seed).derive_seed('chapter:%d' % chapter_num)
+
+
+def send(stream, message):
+    stream.write(json.dumps(message) + "\n")
+    stream.flush()
+
+
+def receive(stream):
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class Coordinator(object):
+    """Splits novels into work units and hands them out to whichever
+    Workers connect.  A unit whose worker reports failure, goes quiet for
+    longer than unit_timeout seconds, or disconnects, goes back on the
+    queue, up to `retries` more times.
+
+    novels is a sequence of (name, number of chapters, seed).  Call run()
+    to serve until every unit is finished (or has failed for good), then
+    write_novel() to write each novel out, its chapters in order.
+
+    """
+    def __init__(self, novels, host='127.0.0.1', port=0, retries=3,
+                 unit_timeout=600):
+        self.novels = []
+        self.chapters = {}      # novel -> number of chapters
+        self.queue = Queue()
+        self.remaining = 0
+        for (name, chapters, seed) in novels:
+            self.novels.append(name)
+            self.chapters[name] = chapters
+            for chapter_num in xrange(1, chapters + 1):
+                self.queue.put({
+                    'type': 'unit',
+                    'novel': name,
+                    'chapter': chapter_num,
+                    'seed': chapter_seed(seed, chapter_num),
+                    'attempt': 1,
+                })
+                self.remaining += 1
+        self.retries = retries
+        self.unit_timeout = unit_timeout
+        self.results = {}       # (novel, chapter_num) -> result
+        self.failures = {}      # (novel, chapter_num) -> last error
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if self.remaining == 0:
+            self.finished.set()
+
+        coordinator = self
+
+        class Handler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                coordinator.serve_worker(self.connection, self.rfile,
+                                         self.wfile)
+
+        self.server = SocketServer.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+
+    def next_unit(self):
+        while not self.finished.is_set():
+            try:
+                return self.queue.get(timeout=0.25)
+            except Empty:
+                pass
+        return None
+
+    def completed(self, unit, result):
+        with self.lock:
+            self.results[(unit['novel'], unit['chapter'])] = result
+            self.finish_one()
+
+    def failed(self, unit, error):
+        with self.lock:
+            key = (unit['novel'], unit['chapter'])
+            if unit['attempt'] <= self.retries:
+                sys.stderr.write("%s chapter %d failed (attempt %d), "
+                                 "retrying:\n%s\n" % (key + (unit['attempt'], error)))
+                unit = dict(unit, attempt=unit['attempt'] + 1)
+                self.queue.put(unit)
+            else:
+                self.failures[key] = error
+                self.finish_one()
+
+    def finish_one(self):
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.finished.set()
+
+    def serve_worker(self, connection, rfile, wfile):
+        try:
+            message = receive(rfile)
+        except (socket.error, ValueError):
+            return
+        if message is None or message.get('type') != 'ready':
+            return
+        worker = message.get('worker')
+        connection.settimeout(self.unit_timeout)
+        while True:
+            unit = self.next_unit()
+            if unit is None:
+                try:
+                    send(wfile, {'type': 'done'})
+                except socket.error:
+                    pass
+                return
+            try:
+                send(wfile, unit)
+                message = receive(rfile)
+            except (socket.error, ValueError), e:
+                self.failed(unit, 'worker %s: %r' % (worker, e))
+                return
+            if message is None:
+                self.failed(unit, 'worker %s disconnected' % worker)
+                return
+            if message.get('type') == 'result':
+                message['worker'] = worker
+                message['attempt'] = unit['attempt']
+                self.completed(unit, message)
+            else:
+                self.failed(unit, message.get('error'))
+
+    def run(self):
+        """Serve workers until every unit is done with.  Return True if
+        every one of them succeeded.
+
+        """
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            while not self.finished.wait(0.25):
+                pass
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+        return not self.failures
+
+    def write_novel(self, name, stream):
+        """Write out every chapter of the named novel that was published,
+        in order, and return a list of the numbers of those that weren't
+        (see self.failures for why.)
+
+        """
+        writer = MarkdownWriter(stream)
+        title = None
+        missing = []
+        for chapter_num in xrange(1, self.chapters[name] + 1):
+            result = self.results.get((name, chapter_num))
+            if result is None:
+                missing.append(chapter_num)
+                continue
+            if title is None:
+                title = result['title']
+                writer.begin_novel(title.encode('utf-8'))
+            stream.write(result['text'].encode('utf-8'))
+        return missing
+
+    def timings(self):
+        """Return (novel, chapter, worker, attempt, seconds) for each unit
+        that was published.
+
+        """
+        return sorted([
+            (novel, chapter_num, result['worker'], result['attempt'],
+             result['seconds'])
+            for ((novel, chapter_num), result) in self.results.iteritems()
+        ])
+
+
+def publish_unit(publisher_factory, unit):
+    """Publish one chapter.  publisher_factory is called with the novel's
+    name, the seed and a list of Writers, and should return a Publisher
+    for it.
+
+    """
+    buffer = StringIO()
+    writer = MarkdownWriter(buffer)
+    publisher = publisher_factory(unit['novel'], unit['seed'], [writer])
+    started = time.time()
+    writer.begin_chapter(unit['chapter'])
+    publisher.publish_chapter(unit['chapter'])
+    writer.end_chapter(unit['chapter'])
+    return {
+        'type': 'result',
+        'title': publisher.title,
+        'text': buffer.getvalue(),
+        'words': publisher.word_count,
+        'seconds': time.time() - started,
+    }
+
+
+def publish_unit_in_child(publisher_factory, unit):
+    """Publish one chapter in a forked child process, so that the world
+    this process set up is left just as it was for the next one.
+
+    """
+    (r, w) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            result = publish_unit(publisher_factory, unit)
+        except Exception:
+            result = {'type': 'failed', 'error': traceback.format_exc()}
+        out = os.fdopen(w, 'w')
+        json.dump(result, out)
+        out.close()
+        os._exit(0)
+    os.close(w)
+    inp = os.fdopen(r)
+    data = inp.read()
+    inp.close()
+    os.waitpid(pid, 0)
+    if not data:
+        return {'type': 'failed', 'error': 'child process died'}
+    return json.loads(data)
+
+
+def run_worker(address, publisher_factory, name=None):
+    """Connect to the Coordinator at address and publish the units it
+    hands out until it says we're done.
+
+    """
+    if name is None:
+        name = '%s:%d' % (socket.gethostname(), os.getpid())
+    connection = socket.create_connection(address)
+    rfile = connection.makefile('rb')
+    wfile = connection.makefile('wb')
+    try:
+        send(wfile, {'type': 'ready', 'worker': name})
+        while True:
+            unit = receive(rfile)
+            if unit is None or unit['type'] == 'done':
+                break
+            send(wfile, publish_unit_in_child(publisher_factory, unit))
+    finally:
+        rfile.close()
+        wfile.close()
+        connection.close()
@@ -0,0 +1,222 @@
+import re
+
+### EVENTS ###
+
+# the event types themselves, which everything else (Actor.emit,
+# the writers) makes or reads, and the collectors they're emitted into;
+# kept apart from the machinery in swallows.engine.events so that they
+# import nothing of the engine, and anything can import them.
+
+# the tags that stand for each participant in an event's phrase, and which
+# of the participant's forms (see Actor.forms) each is replaced with
+FORM_TAGS = (('<indef-%d>', 'indef'), ('<his-%d>', 'his'),
+             ('<him-%d>', 'him'), ('<he-%d>', 'he'),
+             ('<was-%d>', 'was'), ('<is-%d>', 'is'))
+PARTICIPANT_TAGS = []
+
+
+def participant_tags(i):
+    while len(PARTICIPANT_TAGS) <= i:
+        n = len(PARTICIPANT_TAGS) + 1
+        PARTICIPANT_TAGS.append(('<%d>' % n, tuple([
+            (tag % n, form) for (tag, form) in FORM_TAGS
+        ])))
+    return PARTICIPANT_TAGS[i]
+
+
+class Event(object):
+    def __init__(self, phrase, participants, excl=False,
+                 previous_location=None,
+                 speaker=None,
+                 addressed_to=None,
+                 exciting=False,
+                 radius=0):
+        """participants[0] is always the initiator, and we
+        record the location that the event was initiated in.
+
+        For now, we assume such an event can be:
+        - observed by every actor at that location
+        - affects only actors at that location
+
+        ...unless it has a radius, which is how many exits away it can
+        still be heard.  Every animate within that many exits is told
+        about it (see Animate.hear), even though they weren't there.
+
+        In the future, we *may* have:
+        - active and passive participants
+        - active participants all must be present at the location
+        - passive participants need not be
+        (probably done by passing a number n: the first n
+        participants are to be considered active)
+
+        speaker and addressed_to apply to dialogue.
+        If speaker == None, it means the narrator is speaking.
+        If addressed_to == None, it means the reader is being spoken to.
+
+        """
+        self.phrase = phrase
+        self.participants = participants
+        self.location = participants[0].location
+        self._previous_location = previous_location
+        self.excl = excl
+        self.speaker = speaker
+        self.addressed_to = addressed_to
+        self.exciting = exciting
+        self.radius = radius
+        # if this event is a rephrasing of another, the original
+        self.origin = None
+
+    def rephrase(self, new_phrase):
+        """Does not modify the event.  Returns a new copy."""
+        event = Event(new_phrase, self.participants, excl=self.excl)
+        event.origin = self if self.origin is None else self.origin
+        return event
+
+    def ending_with(self, words, joiner=' '):
+        """Return a copy of this event (see rephrase) with the given words
+        on the end of its phrase, unless it already ends with them.  See
+        add_to_phrase.
+
+        """
+        phrase = add_to_phrase(self.phrase, words, joiner=joiner)
+        if phrase == self.phrase:
+            return self
+        return self.rephrase(phrase)
+
+    def initiator(self):
+        return self.participants[0]
+
+    def previous_location(self):
+        return self._previous_location
+
+    def render(self):
+        phrase = self.phrase
+        for (i, participant) in enumerate(self.participants):
+            (tag, tags) = participant_tags(i)
+            if tag in phrase:
+                phrase = phrase.replace(tag, participant.render(event=self))
+            if '-%d>' % (i + 1) in phrase:
+                forms = participant.forms()
+                for (tag, form) in tags:
+                    phrase = phrase.replace(tag, forms[form])
+        return phrase
+
+    def __str__(self):
+        phrase = self.render()
+        if self.excl:
+            phrase = phrase + '!'
+        else:
+            phrase = phrase + '.'
+        return phrase[0].upper() + phrase[1:]
+
+
+class AggregateEvent(Event):
+    """Attempt at a way to combine multiple events into a single
+    sentence.  Each constituent event must have the same initiator.
+
+    This is definitely not as nice as it could be.
+
+    """
+    def __init__(self, template, events, excl=False):
+        self.template = template
+        self.events = events
+        self.excl = excl
+        self.radius = 0
+        self.origin = None
+        self.phrase = 'SEE SUBEVENTS PLZ'
+        self._initiator = self.events[0].initiator()
+        for event in self.events:
+            assert event.initiator() == self._initiator
+        self.location = self._initiator.location
+
+    def rephrase(self, new_phrase):
+        #raise NotImplementedError
+        return self
+
+    def initiator(self):
+        return self._initiator
+
+    def previous_location(self):
+        return self.events[0].previous_location()
+
+    def __str__(self):
+        phrase = self.template % tuple([x.render() for x in self.events])
+        if self.excl:
+            phrase = phrase + '!'
+        else:
+            phrase = phrase + '.'
+        return phrase[0].upper() + phrase[1:]
+
+
+# the punctuation (and closing quote) a phrase might end with
+PHRASE_ENDING = re.compile(r"^(.*?)([.,;:!?'\"]*)$", re.DOTALL)
+
+
+def add_to_phrase(phrase, words, joiner=' '):
+    """Return the phrase with the given words added to the end of it
+    (after joiner), but before any punctuation or closing quote it ends
+    with; so "'Why, <2>?'" with "again" becomes "'Why, <2>, again?'".  If
+    the phrase already ends with the words, it is returned as it is.
+
+    """
+    (body, ending) = PHRASE_ENDING.match(phrase).groups()
+    if body == words or body.endswith((' ' + words, ',' + words)):
+        return phrase
+    if "'" in ending or '"' in ending:
+        # inside a quotation, it's "..., again"
+        joiner = ', '
+    return '%s%s%s%s' % (body.rstrip(',') if joiner.startswith(',') else body,
+                         joiner, words, ending)
+
+
+### COLLECTORS ###
+
+class EventCollector(object):
+    def __init__(self, recorder=None):
+        self.events = []
+        # a FlightRecorder, if we're keeping one
+        self.recorder = recorder
+
+    def wants(self, phrase, participants):
+        """Called by Actor.emit before it goes to the trouble of making an
+        Event; if this returns False, it doesn't.
+
+        """
+        return True
+    
+    def collect(self, event):
+        if self.recorder is not None:
+            self.recorder.record_event(event)
+        if self.events and str(event) == str(self.events[-1]):
+            raise ValueError('Duplicate event: %s' % event)
+        if event.phrase == '<1> went to <2>':
+            assert event.previous_location() is not None
+            assert event.previous_location() != event.location
+        self.events.append(event)
+
+
+class EventSink(object):
+    """Just keeps every event it's given, in order, and checks nothing --
+    unlike an EventCollector, which insists that the events it's given
+    make a sensible story (no event twice in a row, and so on.)  That's
+    what you want to subscribe to an EventBus with a filter, as any old
+    subset of a sensible story might well not be one itself.
+
+    """
+    def __init__(self):
+        self.events = []
+
+    def collect(self, event):
+        self.events.append(event)
+
+
+# not really needed, as emit() does nothing if there is no collector
+class Oblivion(EventCollector):
+    def wants(self, phrase, participants):
+        return False
+
+    def collect(self, event):
+        pass
+
+
+oblivion = Oblivion()
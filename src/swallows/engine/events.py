@@ -1,6 +1,20 @@
-import random
+from collections import deque
+import multiprocessing
 import sys
 
+from swallows.engine.checkpoint import ChapterHistory
+from swallows.engine.event import (
+    Event, AggregateEvent, EventCollector, EventSink, PHRASE_ENDING
+)
+from swallows.engine.objects import Actor, registry
+from swallows.engine.query import EventIndex
+from swallows.engine.recorder import FlightRecorder
+from swallows.engine.rng import (
+    RandomStream, RandomStreams, streams as default_streams
+)
+from swallows.engine.runtime import Scheduler
+from swallows.engine.writers import MarkdownWriter
+
 # TODO
 
 # Diction:
@@ -13,129 +27,113 @@ import sys
 
 ### EVENTS ###
 
-class Event(object):
-    def __init__(self, phrase, participants, excl=False,
-                 previous_location=None,
-                 speaker=None,
-                 addressed_to=None,
-                 exciting=False):
-        """participants[0] is always the initiator, and we
-        record the location that the event was initiated in.
-
-        For now, we assume such an event can be:
-        - observed by every actor at that location
-        - affects only actors at that location
-
-        In the future, we *may* have:
-        - active and passive participants
-        - active participants all must be present at the location
-        - passive participants need not be
-        (probably done by passing a number n: the first n
-        participants are to be considered active)
-
-        speaker and addressed_to apply to dialogue.
-        If speaker == None, it means the narrator is speaking.
-        If addressed_to == None, it means the reader is being spoken to.
+# (Event and AggregateEvent themselves, and the EventCollectors that
+# gather them up, live in swallows.engine.event.)
 
-        """
-        self.phrase = phrase
-        self.participants = participants
-        self.location = participants[0].location
-        self._previous_location = previous_location
-        self.excl = excl
-        self.speaker = speaker
-        self.addressed_to = addressed_to
-        self.exciting = exciting
-
-    def rephrase(self, new_phrase):
-        """Does not modify the event.  Returns a new copy."""
-        return Event(new_phrase, self.participants, excl=self.excl)
-
-    def initiator(self):
-        return self.participants[0]
-
-    def previous_location(self):
-        return self._previous_location
-
-    def render(self):
-        phrase = self.phrase
-        i = 0
-        for participant in self.participants:
-            phrase = phrase.replace('<%d>' % (i + 1), participant.render(event=self))
-            phrase = phrase.replace('<indef-%d>' % (i + 1), participant.indefinite())
-            phrase = phrase.replace('<his-%d>' % (i + 1), participant.posessive())
-            phrase = phrase.replace('<him-%d>' % (i + 1), participant.accusative())
-            phrase = phrase.replace('<he-%d>' % (i + 1), participant.pronoun())
-            phrase = phrase.replace('<was-%d>' % (i + 1), participant.was())
-            phrase = phrase.replace('<is-%d>' % (i + 1), participant.is_())
-            i = i + 1
-        return phrase
-
-    def __str__(self):
-        phrase = self.render()
-        if self.excl:
-            phrase = phrase + '!'
-        else:
-            phrase = phrase + '.'
-        return phrase[0].upper() + phrase[1:]
 
+class Subscription(object):
+    """What a subscriber to an EventBus wants to hear about.  Every one of
+    the criteria given must hold:
 
-class AggregateEvent(Event):
-    """Attempt at a way to combine multiple events into a single
-    sentence.  Each constituent event must have the same initiator.
+    - phrase: the event's phrase template is this (or, if a set, one of
+      these)
+    - initiator: the event was initiated by this actor
+    - kind: one of the participants is an instance of this class (or of
+      one of this tuple of classes)
+    - location: the event happened here
+    - predicate: called with the event (once it's been made), returns true
 
-    This is definitely not as nice as it could be.
+    All but predicate are checked before the Event is even made.
 
     """
-    def __init__(self, template, events, excl=False):
-        self.template = template
-        self.events = events
-        self.excl = excl
-        self.phrase = 'SEE SUBEVENTS PLZ'
-        self._initiator = self.events[0].initiator()
-        for event in self.events:
-            assert event.initiator() == self._initiator
-        self.location = self._initiator.location
-
-    def rephrase(self, new_phrase):
-        #raise NotImplementedError
-        return self
-
-    def initiator(self):
-        return self._initiator
+    def __init__(self, subscriber, phrase=None, initiator=None, kind=None,
+                 location=None, predicate=None):
+        self.subscriber = subscriber
+        if isinstance(phrase, basestring):
+            phrase = frozenset([phrase])
+        elif phrase is not None:
+            phrase = frozenset(phrase)
+        self.phrases = phrase
+        self.initiator = initiator
+        self.kind = kind
+        self.location = location
+        self.predicate = predicate
+
+    def wants(self, phrase, participants):
+        if self.phrases is not None and phrase not in self.phrases:
+            return False
+        if self.initiator is not None and participants[0] is not self.initiator:
+            return False
+        if self.location is not None and participants[0].location is not self.location:
+            return False
+        if self.kind is not None:
+            for participant in participants:
+                if isinstance(participant, self.kind):
+                    break
+            else:
+                return False
+        return True
 
-    def previous_location(self):
-        return self.events[0].previous_location()
 
-    def __str__(self):
-        phrase = self.template % tuple([x.render() for x in self.events])
-        if self.excl:
-            phrase = phrase + '!'
-        else:
-            phrase = phrase + '.'
-        return phrase[0].upper() + phrase[1:]
+class EventBus(object):
+    """Stands in for an EventCollector, and passes each event on to every
+    subscriber (something with a collect method, such as an EventSink)
+    whose Subscription matches it.  (An EventCollector only makes a good
+    subscriber if it's subscribed to everything: it checks that what it's
+    given reads as a story, and a filtered part of one needn't.)  If no subscriber wants an event, it's
+    never made.
 
+    Subscriptions on particular phrases are looked up by phrase, so adding
+    a lot of them, each for a few phrases, doesn't slow down all the
+    events they don't care about.
 
-class EventCollector(object):
+    """
     def __init__(self):
-        self.events = []
-    
-    def collect(self, event):
-        if self.events and str(event) == str(self.events[-1]):
-            raise ValueError('Duplicate event: %s' % event)
-        if event.phrase == '<1> went to <2>':
-            assert event.previous_location() is not None
-            assert event.previous_location() != event.location
-        self.events.append(event)
+        self.by_phrase = {}     # phrase -> list of Subscriptions
+        self.general = []       # Subscriptions not on particular phrases
 
+    def subscribe(self, subscriber, **criteria):
+        """Subscribe the given subscriber to events matching the given
+        criteria (see Subscription), and return the Subscription.
 
-# not really needed, as emit() does nothing if there is no collector
-class Oblivion(EventCollector):
-    def collect(self, event):
-        pass
+        """
+        subscription = Subscription(subscriber, **criteria)
+        if subscription.phrases is None:
+            self.general.append(subscription)
+        else:
+            for phrase in subscription.phrases:
+                self.by_phrase.setdefault(phrase, []).append(subscription)
+        return subscription
 
+    def unsubscribe(self, subscription):
+        if subscription.phrases is None:
+            self.general.remove(subscription)
+        else:
+            for phrase in subscription.phrases:
+                self.by_phrase[phrase].remove(subscription)
 
-oblivion = Oblivion()
+    def candidates(self, phrase):
+        specific = self.by_phrase.get(phrase)
+        if specific:
+            return specific + self.general
+        return self.general
+
+    def wants(self, phrase, participants):
+        for subscription in self.candidates(phrase):
+            if subscription.wants(phrase, participants):
+                return True
+        return False
+
+    def collect(self, event):
+        phrase = event.phrase
+        participants = event.participants
+        for subscription in self.candidates(phrase):
+            if not subscription.wants(phrase, participants):
+                continue
+            if (subscription.predicate is not None and
+                not subscription.predicate(event)):
+                continue
+            subscription.subscriber.collect(event)
 
 
 ### EDITOR AND PUBLISHER ###
@@ -166,8 +164,14 @@ class Editor(object):
 
     """
  
-    def __init__(self, collector, main_characters):
-        self.events = list(reversed(collector.events))
+    def __init__(self, collector, main_characters, rng=None, word_limit=None,
+                 processes=None, batch_size=16, paragraph_seeds=None,
+                 pool=None):
+        self.events = deque(collector.events)
+        # where the Editor's (and its transformers') decisions come from
+        if rng is None:
+            rng = default_streams.stream('editor')
+        self.rng = rng
         self.main_characters = main_characters
         self.pov_index = 0
         self.transformers = []
@@ -177,31 +181,106 @@ class Editor(object):
         self.last_seen_at = {}
         # maps characters to things that happened to them while not narrated
         self.exciting_developments = {}
+        # told about each paragraph as it is published; see add_observer
+        self.observers = []
+        self.paragraph_num = 0
+        # running count of words published; if we have a word_limit, we
+        # stop publishing paragraphs as soon as we reach it
+        self.word_count = 0
+        self.word_limit = word_limit
+        # if given, transform and render paragraphs in a pool of this many
+        # processes, batch_size paragraphs at a time; see publish_in_parallel
+        self.processes = processes
+        self.batch_size = batch_size
+        # the WorkerPool to do that in, if it's to outlive the Editor (one
+        # is made, and done away with, by publish_in_parallel otherwise)
+        self.pool = pool
+        # RandomStreams from which each paragraph's random stream is
+        # derived, when transforming in parallel
+        self.paragraph_seeds = paragraph_seeds
+        # when being fed events as they happen (see feed), the quota of the
+        # paragraph we're waiting on more events to finish, and how many
+        # events to wait for before trying it again
+        self.pending_quota = None
+        self.wait_for = 0
 
     def add_transformer(self, transformer):
         self.transformers.append(transformer)
 
-    def publish(self):
-        paragraph_num = 1
+    def add_observer(self, observer):
+        """Observers are told about each paragraph once it is published, by
+        a call to observer.paragraph(editor, paragraph_num, events,
+        sentences), where events are the paragraph's final (transformed)
+        events, and sentences the text of each.
+
+        """
+        self.observers.append(observer)
+
+    def feed(self, events):
+        """Give the Editor some more events, which happened after the ones
+        it has already been given.
+
+        """
+        self.events.extend(events)
+
+    def limit_reached(self):
+        return self.word_limit is not None and self.word_count >= self.word_limit
+
+    def publish(self, final=True):
+        """Publish paragraphs from the events we have.  If final is false,
+        more events are still to come (see feed); so publish only the
+        paragraphs that can be finished with the events we have now, and
+        leave the rest until we're called again.  Either way, the novel
+        comes out the same.
+
+        """
+        if self.processes:
+            return self.publish_in_parallel(final=final)
+        if self.paragraph_num == 0:
+            self.paragraph_num = 1
         while len(self.events) > 0:
+            if self.limit_reached():
+                break
+            if not final and len(self.events) < self.wait_for:
+                break
             pov_actor = self.main_characters[self.pov_index]
-            paragraph_events = self.generate_paragraph_events(pov_actor)
+            paragraph_events = self.generate_paragraph_events(
+                pov_actor, complete=final
+            )
+            if paragraph_events is None:
+                break
             for transformer in self.transformers:
                 if paragraph_events:
                     paragraph_events = transformer.transform(
-                        self, paragraph_events, paragraph_num
+                        self, paragraph_events, self.paragraph_num
                     )
             self.publish_paragraph(paragraph_events)
             self.pov_index += 1
             if self.pov_index >= len(self.main_characters):
                 self.pov_index = 0
-            paragraph_num += 1
+            self.paragraph_num += 1
+
+    def generate_paragraph_events(self, pov_actor, complete=True):
+        """Choose the events for the next paragraph, from pov_actor's point
+        of view.  If complete is false, and the events run out before the
+        paragraph is done (or just as it is), put everything back the way it
+        was, and return None.
 
-    def generate_paragraph_events(self, pov_actor):
-        quota = random.randint(10, 25)
+        """
+        quota = self.pending_quota
+        if quota is None:
+            quota = self.rng.randint(10, 25)
+        if not complete:
+            available = len(self.events)
+            taken = []
+            saved = (dict(self.character_location), dict(self.last_seen_at),
+                     dict([(actor, list(developments)) for (actor, developments)
+                           in self.exciting_developments.iteritems()]))
         paragraph_events = []
         while len(paragraph_events) < quota and len(self.events) > 0:
-            event = self.events.pop()
+            event = self.events.popleft()
+            if not complete:
+                taken.append(event)
 
             if not paragraph_events:
                 # this is the first sentence of the paragraph
@@ -230,18 +309,311 @@ class Editor(object):
                        (event.participants[1], event.participants[2])
                    )
 
+        if not complete and not self.events:
+            # (the last event stays unedited, as the EventCollector still
+            # compares the next event to it)
+            self.events.extendleft(reversed(taken))
+            (self.character_location, self.last_seen_at,
+             self.exciting_developments) = saved
+            self.pending_quota = quota
+            self.wait_for = max(2 * available, 32)
+            return None
+        self.pending_quota = None
+        self.wait_for = 0
         return paragraph_events
 
-    def publish_paragraph(self, paragraph_events):
-        for event in paragraph_events:
-            sys.stdout.write(str(event) + "  ")
-            #sys.stdout.write("\n")
-        print
-        print
+    def publish_in_parallel(self, final=True):
+        """Like publish, but only the choosing of each paragraph's events
+        (which depends on every paragraph before it) is done here.  Running
+        the transformers over the paragraphs, and rendering them, is done
+        in a pool of worker processes, a batch of paragraphs at a time; the
+        paragraphs are then published in order, as usual.  final means
+        what it does to publish: if it's false, only the paragraphs that
+        can be finished with the events we have so far are published (a
+        batch may come up short), and the rest wait for the next call.
+
+        Only the leading transformers which are paragraph_local can be run
+        in the workers; from the first that isn't onwards, they're run here
+        (and then so is the rendering.)
+
+        Each paragraph's transformers draw from a random stream of its
+        own, so the novel doesn't depend on how many processes there are,
+        or on how the paragraphs are batched -- but it isn't the same novel
+        publish() would write.
+
+        """
+        local = []
+        for transformer in self.transformers:
+            if not transformer.paragraph_local:
+                break
+            local.append(transformer)
+        rest = self.transformers[len(local):]
+        seeds = self.paragraph_seeds
+        if seeds is None:
+            seeds = RandomStreams(self.rng.randint(0, 2 ** 30))
+
+        pool = self.pool
+        if pool is None:
+            pool = WorkerPool(self.processes)
+        try:
+            if self.paragraph_num == 0:
+                self.paragraph_num = 1
+            waiting = False
+            while len(self.events) > 0 and not waiting:
+                if self.limit_reached():
+                    break
+                batch = []
+                states = []
+                while len(batch) < self.batch_size and len(self.events) > 0:
+                    if not final and len(self.events) < self.wait_for:
+                        waiting = True
+                        break
+                    pov_actor = self.main_characters[self.pov_index]
+                    paragraph_events = self.generate_paragraph_events(
+                        pov_actor, complete=final
+                    )
+                    if paragraph_events is None:
+                        waiting = True
+                        break
+                    batch.append(paragraph_events)
+                    # what the transformers would see of us, if they were
+                    # run now, as publish runs them
+                    states.append(EditorState(
+                        self, self.paragraph_num + len(states)
+                    ))
+                    self.pov_index += 1
+                    if self.pov_index >= len(self.main_characters):
+                        self.pov_index = 0
+                if not batch:
+                    break
+                work = []
+                for (i, paragraph_events) in enumerate(batch):
+                    paragraph_num = self.paragraph_num + i
+                    work.append((
+                        paragraph_num,
+                        [encode_event(event) for event in paragraph_events],
+                        seeds.derive_seed('paragraph:%d' % paragraph_num),
+                        local, states[i], not rest
+                    ))
+                results = pool.map(transform_paragraph, work)
+                for (paragraph_events, (paragraph_num, encoded, seed, local_,
+                                        state, render),
+                     (transformed, sentences)) in zip(batch, work, results):
+                    if self.limit_reached():
+                        return
+                    paragraph_events = [
+                        decode_event(event, paragraph_events)
+                        for event in transformed
+                    ]
+                    editor = ParagraphEditor(self, seed)
+                    for transformer in rest:
+                        if paragraph_events:
+                            paragraph_events = transformer.transform(
+                                editor, paragraph_events, paragraph_num
+                            )
+                    self.publish_paragraph(paragraph_events, sentences)
+                    self.paragraph_num += 1
+        finally:
+            if pool is not self.pool:
+                pool.close()
+
+    def publish_paragraph(self, paragraph_events, sentences=None):
+        # render each sentence once, no matter how many observers there are
+        # (and so no matter how many formats the novel is being written in)
+        if sentences is None:
+            sentences = [str(event) for event in paragraph_events]
+        for sentence in sentences:
+            self.word_count += len(sentence.split())
+        for observer in self.observers:
+            observer.paragraph(
+                self, self.paragraph_num, paragraph_events, sentences
+            )
+
+
+class ParagraphEditor(object):
+    """What a transformer sees as the editor, when the Editor is
+    transforming paragraphs in parallel: the Editor (or, in a worker
+    process, its EditorState), but with a random stream for just the one
+    paragraph.
+
+    """
+    def __init__(self, editor, seed):
+        self.editor = editor
+        self.rng = RandomStream(seed, batch_size=8)
+
+    def __getattr__(self, name):
+        return getattr(self.editor, name)
+
+
+class EditorState(object):
+    """What a worker process knows of the Editor, while transforming one
+    paragraph: the main characters, the paragraph's number, and where the
+    Editor had everyone, and what it was keeping back from each of them,
+    once it had chosen the paragraph's events.  Made in the publishing
+    process, with actors given by their registry ids; call decode() in the
+    worker to get the actors back.
+
+    """
+    def __init__(self, editor, paragraph_num):
+        def id(actor):
+            return None if actor is None else actor.id
+        self.paragraph_num = paragraph_num
+        self.word_limit = editor.word_limit
+        self.main_characters = [id(c) for c in editor.main_characters]
+        self.character_location = dict([
+            (id(c), id(l)) for (c, l) in editor.character_location.iteritems()
+        ])
+        self.last_seen_at = dict([
+            (id(c), id(l)) for (c, l) in editor.last_seen_at.iteritems()
+        ])
+        self.exciting_developments = dict([
+            (id(c), [(id(o), id(l)) for (o, l) in developments])
+            for (c, developments) in editor.exciting_developments.iteritems()
+        ])
+
+    def decode(self):
+        def actor(id):
+            return None if id is None else registry[id]
+        self.main_characters = [actor(c) for c in self.main_characters]
+        self.character_location = dict([
+            (actor(c), actor(l)) for (c, l) in self.character_location.iteritems()
+        ])
+        self.last_seen_at = dict([
+            (actor(c), actor(l)) for (c, l) in self.last_seen_at.iteritems()
+        ])
+        self.exciting_developments = dict([
+            (actor(c), [(actor(o), actor(l)) for (o, l) in developments])
+            for (c, developments) in self.exciting_developments.iteritems()
+        ])
+        return self
+
+    def __getattr__(self, name):
+        # (only called for what we don't have)
+        raise AttributeError(
+            "a transformer running in a worker process can't see the "
+            "Editor's %r; it shouldn't be paragraph_local" % name
+        )
+
+
+class WorkerPool(object):
+    """The pool of processes Editor.publish_in_parallel transforms
+    paragraphs in, kept for as long as a Publisher is publishing, rather
+    than made afresh for every chapter.
+
+    The workers are forked from this process, and so know the actors that
+    had been made when they were (events are sent to them with actors
+    given by registry id); if any more have been made since (extras in a
+    Crowd, say), the pool is forked again before it's next used.
+
+    """
+    def __init__(self, processes):
+        self.processes = processes
+        self.pool = None
+        self.actors = 0
+
+    def map(self, function, work):
+        if self.pool is not None and len(registry) != self.actors:
+            self.close()
+        if self.pool is None:
+            # don't let the workers inherit half-written output, or it'll
+            # get written twice
+            sys.stdout.flush()
+            sys.stderr.flush()
+            self.actors = len(registry)
+            self.pool = multiprocessing.Pool(self.processes)
+        return self.pool.map(function, work)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def encode_event(event):
+    """Return a picklable description of the given event, with actors
+    given by their registry ids (see decode_event.)
+
+    The events handed to a worker process are numbered, in order, by
+    transform_paragraph.  An event which is one of those is described
+    along with its number, and an event which was made from one of them
+    (by rephrasing it) with the number of the one it was made from.
+
+    """
+    def id(actor):
+        return None if actor is None else actor.id
+    if isinstance(event, AggregateEvent):
+        return ('aggregate', event.template, event.excl,
+                [encode_event(e) for e in event.events])
+    origin = None
+    if event.origin is not None:
+        origin = getattr(event.origin, 'number', None)
+    return ('event', event.phrase, [p.id for p in event.participants],
+            id(event.location), id(event._previous_location), event.excl,
+            id(event.speaker), id(event.addressed_to), event.exciting,
+            getattr(event, 'number', None), origin)
+
+
+def decode_event(encoded, originals=None):
+    """Make an Event from what encode_event returned.  If given originals,
+    the events which were numbered, an event which is one of them is that
+    very event (changed the way the worker changed it), and an event which
+    was made from one of them has it as its origin, so that observers of
+    the Editor can tell where each published event came from.
+
+    """
+    def actor(id):
+        return None if id is None else registry[id]
+    if encoded[0] == 'aggregate':
+        (kind, template, excl, events) = encoded
+        return AggregateEvent(template, [
+            decode_event(e, originals) for e in events
+        ], excl=excl)
+    (kind, phrase, participants, location, previous_location, excl,
+     speaker, addressed_to, exciting, number, origin) = encoded
+    if originals is not None and number is not None:
+        event = originals[number]
+    else:
+        event = Event(phrase, [registry[id] for id in participants],
+                      excl=excl, previous_location=actor(previous_location),
+                      speaker=actor(speaker),
+                      addressed_to=actor(addressed_to), exciting=exciting)
+        if originals is not None and origin is not None:
+            original = originals[origin]
+            event.origin = original if original.origin is None else original.origin
+    event.phrase = phrase
+    event.participants = [registry[id] for id in participants]
+    event.location = actor(location)
+    return event
+
+
+def transform_paragraph((paragraph_num, encoded, seed, transformers, state,
+                         render)):
+    """Run in a worker process: run the given transformers over a
+    paragraph's events, and render them, if asked to.
+
+    """
+    events = []
+    for (number, e) in enumerate(encoded):
+        event = decode_event(e)
+        event.number = number
+        events.append(event)
+    editor = ParagraphEditor(state.decode(), seed)
+    for transformer in transformers:
+        if events:
+            events = transformer.transform(editor, events, paragraph_num)
+    sentences = None
+    if render:
+        sentences = [str(event) for event in events]
+    return ([encode_event(event) for event in events], sentences)
 
 
 class Transformer(object):
-    pass
+    # True if the transformer looks at nothing but the paragraph it's
+    # given (and its number, and the editor's random stream), so that
+    # paragraphs can be transformed in parallel.  it has to say so; one
+    # that doesn't is run in the publishing process, after the workers.
+    paragraph_local = False
 
 
 class DeduplicateTransformer(Transformer):
@@ -249,6 +621,8 @@ class DeduplicateTransformer(Transformer):
     # you have two characters, Bob Jones and Bob Smith, and both are
     # named 'Bob', and they are actually two different events... but...
     # for now that is an edge case.
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         events = []
         for event in incoming_events:
@@ -266,8 +640,118 @@ class DeduplicateTransformer(Transformer):
         return events
 
 
+REPETITION_POLICIES = ('drop', 'vary', 'collapse')
+
+
+class SuppressRepetitionTransformer(Transformer):
+    """Catches events which repeat one from not long before -- not just
+    the one right before, like DeduplicateTransformer does, but anywhere
+    in the last `window` events it has seen (across paragraphs.)  By
+    default, events are the same if they have the same phrase and
+    participants; pass by_sentence=True to compare the rendered sentences
+    instead.
+
+    It keeps only the signatures of those events (tuples, or strings), in
+    a sliding window, along with a count of each in the window, so
+    checking an event costs the same no matter how large the window is.
+
+    What happens to a repeated event depends on policy:
+    - 'drop': it is left out
+    - 'vary': it is rephrased, with "again" (or "yet again") on the end --
+      before any punctuation or closing quote (see event.add_to_phrase), and
+      not if it's already there
+    - 'collapse': it is left out, and the event it repeats gets ", more
+      than once" on the end -- if that event is in the same paragraph,
+      and isn't a line of dialogue; otherwise it is varied
+
+    Events which move characters around, or tell the reader where they
+    are, are never touched, as that would leave the reader lost.
+
+    """
+    exempt = frozenset([
+        '<1> went to <2>',
+        '<1> made <his-1> way to <2>',
+        '<1> wandered around for a bit, then came back to <2>',
+        '<1> <was-1> in <2>',
+        '<1> had found <2> in <3>',
+    ])
+
+    def __init__(self, window=50, policy='vary', by_sentence=False):
+        if policy not in REPETITION_POLICIES:
+            raise ValueError('Unknown repetition policy %r' % (policy,))
+        self.window = window
+        self.policy = policy
+        self.by_sentence = by_sentence
+        self.recent = deque()
+        self.counts = {}
+
+    # it remembers events from earlier paragraphs
+    paragraph_local = False
+
+    def signature(self, event):
+        if self.by_sentence:
+            return str(event)
+        return (event.phrase, tuple(event.participants))
+
+    def remember(self, signature):
+        self.recent.append(signature)
+        self.counts[signature] = self.counts.get(signature, 0) + 1
+        if len(self.recent) > self.window:
+            old = self.recent.popleft()
+            count = self.counts[old] - 1
+            if count:
+                self.counts[old] = count
+            else:
+                del self.counts[old]
+
+    def quoted(self, event):
+        """Return whether the event's phrase ends in a quotation."""
+        ending = PHRASE_ENDING.match(event.phrase).group(2)
+        return "'" in ending or '"' in ending
+
+    def vary(self, event, times):
+        if times > 1:
+            (body, ending) = PHRASE_ENDING.match(event.phrase).groups()
+            if body.endswith(' again') and not body.endswith(' yet again'):
+                # it already said "again"; this time, it's "yet again"
+                return event.rephrase(body[:-len('again')] + 'yet again' + ending)
+            return event.ending_with('yet again')
+        return event.ending_with('again')
+
+    def transform(self, editor, incoming_events, paragraph_num):
+        events = []
+        # signature -> index in events of its first event in this paragraph
+        in_paragraph = {}
+        for event in incoming_events:
+            if (isinstance(event, AggregateEvent) or
+                event.phrase in self.exempt):
+                events.append(event)
+                continue
+            signature = self.signature(event)
+            times = self.counts.get(signature, 0)
+            self.remember(signature)
+            if times:
+                if self.policy == 'drop':
+                    continue
+                if self.policy == 'collapse':
+                    earlier = in_paragraph.get(signature)
+                    # ("'...,' more than once" doesn't work, though)
+                    if earlier is not None and not self.quoted(events[earlier]):
+                        events[earlier] = events[earlier].ending_with(
+                            'more than once', joiner=', '
+                        )
+                        continue
+                event = self.vary(event, times)
+            if signature not in in_paragraph:
+                in_paragraph[signature] = len(events)
+            events.append(event)
+        return events
+
+
 class UsePronounsTransformer(Transformer):
     # replace repeated proper nouns with pronouns
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         events = []
         for event in incoming_events:
@@ -281,6 +765,8 @@ class UsePronounsTransformer(Transformer):
 
 
 class MadeTheirWayToTransformer(Transformer):
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         events = []
         for event in incoming_events:
@@ -309,16 +795,16 @@ class MadeTheirWayToTransformer(Transformer):
         return events
 
 
-# well well well
-from swallows.engine.objects import Actor
 weather = Actor('the weather')
 
 
 class AddWeatherFrifferyTransformer(Transformer):
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         events = []
         if paragraph_num == 1:
-            choice = random.randint(0, 3)
+            choice = editor.rng.randint(0, 3)
             if choice == 0:
                 events.append(Event("It was raining", [weather]))
             if choice == 1:
@@ -331,6 +817,8 @@ class AddWeatherFrifferyTransformer(Transformer):
 
 
 class AddParagraphStartFrifferyTransformer(Transformer):
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         first_event = incoming_events[0]
         if paragraph_num == 1:
@@ -341,7 +829,7 @@ class AddParagraphStartFrifferyTransformer(Transformer):
             return incoming_events
         if " was in " in str(first_event):
             return incoming_events
-        choice = random.randint(0, 8)
+        choice = editor.rng.randint(0, 8)
         if choice == 0:
             first_event = first_event.rephrase(
                 "Later on, " + first_event.phrase
@@ -364,6 +852,8 @@ class AddParagraphStartFrifferyTransformer(Transformer):
 class AggregateEventsTransformer(Transformer):
     # replace "Bob went to the kitchen.  Bob saw the toaster"
     # with "Bob went to the kitchen, where he saw the toaster"
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         events = []
         for event in incoming_events:
@@ -388,6 +878,8 @@ class AggregateEventsTransformer(Transformer):
 class DetectWanderingTransformer(Transformer):
     # not used yet
     # if they 'made their way' to their current location...
+    paragraph_local = True
+
     def transform(self, editor, incoming_events, paragraph_num):
         events = []
         for event in incoming_events:
@@ -401,35 +893,205 @@ class DetectWanderingTransformer(Transformer):
 class Publisher(object):
     def __init__(self, characters=(), setting=(), friffery=False,
                  debug=False, title='Untitled', chapters=18,
-                 events_per_chapter=810):
+                 events_per_chapter=810,
+                 belief_capacity=None, eviction_policy=None,
+                 seed=None, streams=None, checkpoint_interval=None,
+                 flight_recorder=32, index_events=False, exporter=None,
+                 word_target=None,
+                 repetition_window=None, repetition_policy='vary',
+                 writers=None, coroutines=False, tasks=(),
+                 memory_report=None, crowds=(), subscriptions=(),
+                 edit_processes=None):
+        # (checked before anything is done to the characters)
+        if belief_capacity is not None and belief_capacity <= 0:
+            raise ValueError('belief_capacity must be positive')
+        if repetition_policy not in REPETITION_POLICIES:
+            raise ValueError('Unknown repetition policy %r' % (repetition_policy,))
+        # checkpointing only knows how to replay the plain round-and-round
+        # way of doing things (see ChapterHistory.seek)
+        if checkpoint_interval and coroutines:
+            raise ValueError("can't checkpoint chapters run as coroutines")
+        if checkpoint_interval and crowds:
+            raise ValueError("can't checkpoint chapters with crowds in them")
         self.characters = characters
+        # every random decision is drawn from one of these streams; each
+        # character gets its own, as do the editor and the publisher.
+        # give a seed (or some RandomStreams) to get the same novel twice.
+        if streams is None:
+            if seed is None:
+                streams = default_streams
+            else:
+                streams = RandomStreams(seed)
+        self.streams = streams
+        self.rng = streams.stream('publisher')
+        for character in self.characters:
+            character.rng = streams.stream(
+                'character:%s#%d' % (character.name, character.id)
+            )
+        # optionally, bound how many beliefs each character can hold
+        if belief_capacity is not None:
+            for character in self.characters:
+                if eviction_policy is None:
+                    character.limit_beliefs(belief_capacity)
+                else:
+                    character.limit_beliefs(belief_capacity,
+                                            policy=eviction_policy)
         self.setting = setting
         self.friffery = friffery
         self.debug = debug
         self.title = title
         self.chapters = chapters
         self.events_per_chapter = events_per_chapter
+        # if given, keep a ChapterHistory for each chapter, checkpointed
+        # every this-many events, so that we can seek() around in it later
+        self.checkpoint_interval = checkpoint_interval
+        self.histories = {}
+        # keep the last few events and belief changes of each character,
+        # to be dumped if something goes wrong.  0 or None to not bother.
+        self.recorder = None
+        if flight_recorder:
+            self.recorder = FlightRecorder(flight_recorder)
+        # if true, keep an EventIndex of each chapter's events, for querying
+        self.index_events = index_events
+        self.indexes = {}
+        # something like a SQLiteExporter, to write the trace of the
+        # simulation to, along with what the Editor made of it
+        self.exporter = exporter
+        # if given, ignore self.chapters; write chapters until the novel is
+        # this many words long (not counting headings), and stop there,
+        # even if it's in the middle of a chapter.  each chapter is edited
+        # as it is simulated, so the simulation stops there too.
+        self.word_target = word_target
+        self.word_count = 0
+        # if given, have the Editor catch events repeated within this many
+        # events of each other (see SuppressRepetitionTransformer)
+        self.repetition_window = repetition_window
+        self.repetition_policy = repetition_policy
+        # each Writer writes the novel out in some format; every paragraph
+        # is rendered once and handed to all of them
+        if writers is None:
+            writers = [MarkdownWriter(sys.stdout)]
+        self.writers = writers
+        # if true, run each character as a coroutine on a Scheduler, rather
+        # than calling live() on each in turn.  each of tasks is called with
+        # the chapter's EventCollector, and should return a generator, to
+        # be run alongside the characters.  (checkpointing only knows how to
+        # replay the plain round-and-round way of doing things.)
+        self.coroutines = coroutines
+        self.tasks = tasks
+        # a MemoryReport, to report on memory use after each chapter
+        self.memory_report = memory_report
+        # Crowds of extras, moved along once every time all the characters
+        # have had a turn, and following them about after each of their
+        # turns (see swallows.engine.crowd)
+        self.crowds = crowds
+        for crowd in self.crowds:
+            crowd.seed(streams.derive_seed('crowd:%s' % crowd.name))
+        # (subscriber, criteria) pairs: each chapter, each subscriber (which
+        # has a collect method; an EventSink, say) is subscribed, with those
+        # criteria, to an EventBus that the characters emit their events
+        # onto.  (the Editor's EventCollector is subscribed to everything.)
+        self.subscriptions = subscriptions
+        # if given, the Editor transforms and renders paragraphs in a pool
+        # of this many processes (see Editor.publish_in_parallel.)  this
+        # makes a different novel from the same seed.  the pool is made
+        # once, the first time it's needed, and kept until we're done.
+        self.edit_processes = edit_processes
+        self.edit_pool = None
 
     def publish_chapter(self, chapter_num):
-        collector = EventCollector()
+        try:
+            if self.word_target is None:
+                collector = self.simulate_chapter(chapter_num)
+                self.edit_chapter(chapter_num, collector)
+            else:
+                self.write_chapter_to_target(chapter_num)
+        except (AssertionError, ValueError):
+            if self.recorder is not None:
+                sys.stdout.flush()
+                self.recorder.dump(sys.stderr)
+            raise
+
+    def simulate_chapter(self, chapter_num, collector=None, stop=None):
+        """Let the characters live through a chapter, and return the
+        EventCollector holding everything that happened.  If stop is given,
+        it's called after every round (or step, with coroutines), and the
+        chapter ends early if it returns true.
+
+        """
+        if collector is None:
+            collector = EventCollector(recorder=self.recorder)
+        if self.recorder is not None:
+            self.recorder.begin_chapter(self.characters)
+        emitted_to = collector
+        if self.subscriptions:
+            emitted_to = EventBus()
+            emitted_to.subscribe(collector)
+            for (subscriber, criteria) in self.subscriptions:
+                emitted_to.subscribe(subscriber, **criteria)
         
         for character in self.characters:
-            character.collector = collector
+            if self.recorder is not None:
+                self.recorder.attach(character)
+            character.collector = emitted_to
             # don't continue a conversation from the previous chapter, please
             character.topic = None
-            character.place_in(random.choice(self.setting))
+            character.place_in(self.rng.choice(self.setting))
+
+        history = None
+        if self.checkpoint_interval:
+            history = ChapterHistory(chapter_num, self.characters, collector,
+                                     interval=self.checkpoint_interval)
+            self.histories[chapter_num] = history
+
+        for crowd in self.crowds:
+            crowd.begin_chapter(emitted_to, self.characters)
 
-        while len(collector.events) < self.events_per_chapter:
+        if self.coroutines:
+            scheduler = Scheduler()
             for character in self.characters:
-                character.live()
+                scheduler.spawn_animate(character)
+                for crowd in self.crowds:
+                    scheduler.spawn(crowd.following(self.characters))
+            for crowd in self.crowds:
+                scheduler.spawn(crowd.run(self.characters))
+            for task in self.tasks:
+                scheduler.spawn(task(collector))
+            scheduler.run(until=lambda:
+                len(collector.events) >= self.events_per_chapter or
+                (stop is not None and stop())
+            )
+            for character in self.characters:
+                character.runtime = None
+        else:
+            turn = 0
+            while len(collector.events) < self.events_per_chapter:
+                for character in self.characters:
+                    if history:
+                        history.tick(turn)
+                    character.live()
+                    turn += 1
+                    for crowd in self.crowds:
+                        crowd.follow(self.characters)
+                for crowd in self.crowds:
+                    crowd.tick(self.characters)
+                if stop is not None and stop():
+                    break
                 #print len(collector.events) # , repr([str(e) for e in collector.events])
 
+        for crowd in self.crowds:
+            crowd.end_chapter()
+
+        index = None
+        if self.index_events or self.debug:
+            index = EventIndex(collector.events)
+        if self.index_events:
+            self.indexes[chapter_num] = index
+
         if self.debug:
             for character in self.characters:
                 print "%s'S EVENTS:" % character.name.upper()                
-                for event in collector.events:
-                    if event.participants[0] != character:
-                        continue
+                for event in index.select(initiator=character):
                     print "%r in %s: %s" % (
                         [p.render(event=event) for p in event.participants],
                         event.location.render(),
@@ -439,13 +1101,63 @@ class Publisher(object):
             for character in self.characters:
                 print "%s'S STATE:" % character.name.upper()
                 character.dump_beliefs()
+                if character.evictions:
+                    print "(%d beliefs forgotten so far)" % character.evictions
                 print
             print "- - - - -"
             print
 
-        editor = Editor(collector, self.characters)
+        return collector
+
+    def edit_chapter(self, chapter_num, collector):
+        """Have an Editor make the events of a chapter into prose."""
+        editor = self.make_editor(chapter_num, collector)
+        self.finish_editing(editor)
+
+    def write_chapter_to_target(self, chapter_num):
+        """Simulate and edit a chapter at the same time, a round at a
+        time, and stop simulating as soon as the novel reaches
+        word_target.
+
+        """
+        collector = EventCollector(recorder=self.recorder)
+        editor = self.make_editor(chapter_num, collector)
+        fed = [len(collector.events)]
+        def stop():
+            events = collector.events[fed[0]:]
+            fed[0] = len(collector.events)
+            if events:
+                editor.feed(events)
+                if self.exporter is not None:
+                    self.exporter.add_events(events)
+                editor.publish(final=False)
+            return editor.limit_reached()
+        self.simulate_chapter(chapter_num, collector=collector, stop=stop)
+        stop()
+        self.finish_editing(editor)
+
+    def make_editor(self, chapter_num, collector):
+        """Return an Editor for the chapter's events (so far), with the
+        transformers and observers it should have.
+
+        """
+        word_limit = None
+        if self.word_target is not None:
+            word_limit = self.word_target - self.word_count
+        editor = Editor(collector, self.characters,
+                        rng=self.streams.stream('editor'),
+                        word_limit=word_limit,
+                        processes=self.edit_processes,
+                        pool=self.edit_pool,
+                        paragraph_seeds=RandomStreams(self.streams.derive_seed(
+                            'editor:chapter:%d' % chapter_num
+                        )))
         editor.add_transformer(MadeTheirWayToTransformer())
         editor.add_transformer(DeduplicateTransformer())
+        if self.repetition_window:
+            editor.add_transformer(SuppressRepetitionTransformer(
+                window=self.repetition_window, policy=self.repetition_policy
+            ))
         editor.add_transformer(AggregateEventsTransformer())
         editor.add_transformer(DetectWanderingTransformer())
         # this one should be last, so prior transformers don't
@@ -456,16 +1168,52 @@ class Publisher(object):
         if self.friffery:
             editor.add_transformer(AddWeatherFrifferyTransformer())
             editor.add_transformer(AddParagraphStartFrifferyTransformer())
+        for writer in self.writers:
+            editor.add_observer(writer)
+        if self.exporter is not None:
+            self.exporter.begin_chapter(self.title, chapter_num,
+                                        collector.events)
+            editor.add_observer(self.exporter)
+        return editor
+
+    def finish_editing(self, editor):
         editor.publish()
+        self.word_count += editor.word_count
+        if self.exporter is not None:
+            self.exporter.end_chapter(self.characters)
 
     def publish(self):
-        print self.title
-        print "=" * len(self.title)
-        print
-
-        for chapter in range(1, self.chapters+1):
-            print "Chapter %d." % chapter
-            print "-----------"
-            print
-
-            self.publish_chapter(chapter)
+        for writer in self.writers:
+            writer.begin_novel(self.title)
+
+        if self.edit_processes:
+            self.edit_pool = WorkerPool(self.edit_processes)
+        try:
+            chapter = 0
+            while self.more_chapters(chapter):
+                chapter += 1
+                for writer in self.writers:
+                    writer.begin_chapter(chapter)
+                if self.memory_report is not None:
+                    self.memory_report.begin_chapter(chapter)
+                self.publish_chapter(chapter)
+                for writer in self.writers:
+                    writer.end_chapter(chapter)
+                # done after publish_chapter has returned, so that only what
+                # outlives the chapter gets counted
+                if self.memory_report is not None:
+                    self.memory_report.end_chapter(chapter, self.characters)
+        finally:
+            if self.edit_pool is not None:
+                self.edit_pool.close()
+                self.edit_pool = None
+
+        for writer in self.writers:
+            writer.end_novel()
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def more_chapters(self, chapters_so_far):
+        if self.word_target is not None:
+            return self.word_count < self.word_target
+        return chapters_so_far < self.chapters
@@ -0,0 +1,244 @@
+import sqlite3
+
+from swallows.engine.event import AggregateEvent
+from swallows.engine.objects import BeliefsBelief, registry
+
+### EXPORTING ###
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS actors (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    kind TEXT
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    novel TEXT,
+    number INTEGER
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    chapter_id INTEGER,
+    seq INTEGER,
+    template TEXT,
+    initiator_id INTEGER,
+    location_id INTEGER,
+    speaker_id INTEGER,
+    addressed_to_id INTEGER,
+    exciting INTEGER,
+    excl INTEGER,
+    paragraph INTEGER,
+    sentence_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS participants (
+    event_id INTEGER,
+    position INTEGER,
+    actor_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS sentences (
+    id INTEGER PRIMARY KEY,
+    chapter_id INTEGER,
+    paragraph INTEGER,
+    position INTEGER,
+    template TEXT,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS beliefs (
+    chapter_id INTEGER,
+    holder_id INTEGER,
+    about_id INTEGER,
+    subject_id INTEGER,
+    kind TEXT,
+    location_id INTEGER,
+    informant_id INTEGER,
+    concealer_id INTEGER,
+    phrase TEXT
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS events_chapter ON events (chapter_id, seq);
+CREATE INDEX IF NOT EXISTS events_template ON events (template);
+CREATE INDEX IF NOT EXISTS events_initiator ON events (initiator_id);
+CREATE INDEX IF NOT EXISTS events_location ON events (location_id);
+CREATE INDEX IF NOT EXISTS events_sentence ON events (sentence_id);
+CREATE INDEX IF NOT EXISTS participants_event ON participants (event_id);
+CREATE INDEX IF NOT EXISTS participants_actor ON participants (actor_id);
+CREATE INDEX IF NOT EXISTS sentences_chapter ON sentences (chapter_id, paragraph);
+CREATE INDEX IF NOT EXISTS beliefs_holder ON beliefs (chapter_id, holder_id);
+CREATE INDEX IF NOT EXISTS beliefs_subject ON beliefs (subject_id);
+"""
+
+INSERTS = {
+    'actors': "INSERT OR REPLACE INTO actors VALUES (?, ?, ?)",
+    'events': "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'participants': "INSERT INTO participants VALUES (?, ?, ?)",
+    'sentences': "INSERT INTO sentences VALUES (?, ?, ?, ?, ?, ?)",
+    'beliefs': "INSERT INTO beliefs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+
+def actor_id(actor):
+    if actor is None:
+        return None
+    return actor.id
+
+
+class SQLiteExporter(object):
+    """Writes the events of each chapter, which paragraph and sentence
+    the Editor made each of them into, the text of those sentences, and
+    what every character believes at the end of the chapter, into a SQLite
+    database, for analysing with SQL instead of regexes.
+
+    Rows are buffered and written batch_size at a time with executemany,
+    and committed, a chapter at a time, by end_chapter; so whatever
+    chapters were finished are in the database even if close() never
+    gets called.  close() creates the indexes.  Actor ids are registry
+    ids, so each database should hold the output of one run.
+
+    A Publisher given an exporter calls begin_chapter, paragraph (as an
+    Editor observer) and end_chapter for each chapter, and close at the
+    end of the novel.  If you're calling publish_chapter yourself, use
+    the exporter in a with statement, to have it closed at the end.
+
+    """
+    def __init__(self, path, batch_size=10000):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.connection.execute("PRAGMA journal_mode = MEMORY")
+        self.connection.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.pending = dict([(table, []) for table in INSERTS])
+        self.exported_actors = 0
+        self.next_event_id = self._next_id('events')
+        self.next_sentence_id = self._next_id('sentences')
+        self.chapter_id = None
+        self.rows = None
+
+    def _next_id(self, table):
+        (max_id,) = self.connection.execute(
+            "SELECT MAX(id) FROM %s" % table
+        ).fetchone()
+        return (max_id or 0) + 1
+
+    def insert(self, table, row):
+        pending = self.pending[table]
+        pending.append(row)
+        if len(pending) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        tables = [table] if table is not None else INSERTS.keys()
+        for table in tables:
+            if self.pending[table]:
+                self.connection.executemany(INSERTS[table], self.pending[table])
+                self.pending[table] = []
+
+    def export_actors(self):
+        for actor in registry.actors[self.exported_actors:]:
+            self.insert('actors', (actor.id, actor.render(),
+                                   actor.__class__.__name__))
+        self.exported_actors = len(registry)
+
+    def begin_chapter(self, novel, chapter_num, events):
+        """Called with a chapter's events before the Editor gets at them."""
+        self.export_actors()
+        cursor = self.connection.execute(
+            "INSERT INTO chapters (novel, number) VALUES (?, ?)",
+            (novel, chapter_num)
+        )
+        self.chapter_id = cursor.lastrowid
+        # the rows for the events are held back until the end of the
+        # chapter, so the Editor can tell us where they went.
+        self.rows = {}
+        self.order = []
+        self.add_events(events)
+
+    def add_events(self, events):
+        """Called with more of a chapter's events, when the chapter is
+        being edited as it happens.
+
+        """
+        for (seq, event) in enumerate(events, len(self.order)):
+            id = self.next_event_id
+            self.next_event_id += 1
+            self.rows[event] = [
+                id, self.chapter_id, seq, event.phrase,
+                actor_id(event.initiator()), actor_id(event.location),
+                actor_id(event.speaker), actor_id(event.addressed_to),
+                int(bool(event.exciting)), int(bool(event.excl)),
+                None, None
+            ]
+            self.order.append(event)
+            for (position, participant) in enumerate(event.participants):
+                self.insert('participants', (id, position, participant.id))
+
+    def sources(self, event):
+        """Yield the collected events that the given published event was
+        made from.
+
+        """
+        if isinstance(event, AggregateEvent):
+            for subevent in event.events:
+                for source in self.sources(subevent):
+                    yield source
+        else:
+            if event.origin is not None:
+                event = event.origin
+            if event in self.rows:
+                yield event
+
+    def paragraph(self, editor, paragraph_num, events, sentences):
+        for (position, (event, sentence)) in enumerate(zip(events, sentences)):
+            id = self.next_sentence_id
+            self.next_sentence_id += 1
+            self.insert('sentences', (id, self.chapter_id, paragraph_num,
+                                      position, event.phrase, sentence))
+            for source in self.sources(event):
+                row = self.rows[source]
+                row[10] = paragraph_num
+                row[11] = id
+
+    def end_chapter(self, characters):
+        """Called once the Editor is done with the chapter."""
+        for event in self.order:
+            self.insert('events', tuple(self.rows[event]))
+        self.rows = None
+        self.order = None
+        for character in characters:
+            self.export_beliefs(character, None, character.beliefs)
+        self.export_actors()
+        self.flush()
+        self.connection.commit()
+
+    def export_beliefs(self, holder, about, belief_set):
+        for subject in belief_set.subjects():
+            for belief in belief_set.beliefs_for(subject):
+                if isinstance(belief, BeliefsBelief):
+                    self.export_beliefs(holder, belief.subject,
+                                        belief.belief_set)
+                    continue
+                self.insert('beliefs', (
+                    self.chapter_id, holder.id, actor_id(about),
+                    subject.id, belief.__class__.__name__,
+                    actor_id(getattr(belief, 'location', None)),
+                    actor_id(getattr(belief, 'informant', None)),
+                    actor_id(getattr(belief, 'concealer', None)),
+                    getattr(belief, 'phrase', None),
+                ))
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.export_actors()
+        self.flush()
+        self.connection.executescript(INDEXES)
+        self.connection.commit()
+        self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
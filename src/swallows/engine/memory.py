@@ -0,0 +1,117 @@
+import gc
+import json
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from swallows.engine.event import Event, AggregateEvent
+from swallows.engine.objects import (
+    ItemLocation, Goal, BeliefSet, BeliefsBelief, Topic
+)
+
+### MEMORY REPORTS ###
+
+# the kinds of objects we count the live instances of (including instances
+# of their subclasses.)
+COUNTED = (Event, AggregateEvent, ItemLocation, Goal, BeliefSet, Topic)
+
+
+def count_beliefs(belief_set):
+    """Return (number of beliefs, number of beliefs nested inside
+    BeliefsBeliefs, at any depth) in the given BeliefSet.
+
+    """
+    own = 0
+    nested = 0
+    for subject in belief_set.subjects():
+        for belief in belief_set.beliefs_for(subject):
+            own += 1
+            if isinstance(belief, BeliefsBelief):
+                (n, m) = count_beliefs(belief.belief_set)
+                nested += n + m
+    return (own, nested)
+
+
+class MemoryReport(object):
+    """Writes a report on memory use after each chapter, as one line of
+    JSON, so that it can be collected and compared along with timings.
+
+    Each report has:
+    - 'chapter': the chapter number
+    - 'objects': the number of live objects of each of the kinds in
+      COUNTED (an instance of AggregateEvent also counts as an Event)
+    - 'gc_objects': the number of objects the garbage collector tracks
+    - 'beliefs': for each character, how many beliefs they hold, and how
+      many more are nested in their beliefs about others' beliefs
+    - 'max_rss_kb': the peak resident set size of the process so far
+    - 'by_line', 'by_file': where memory was allocated during the
+      chapter (the top `top` of each, by growth), from tracemalloc --
+      or null, where tracemalloc isn't available (it isn't, on Python 2,
+      unless the pytracemalloc backport is installed.)
+
+    Counting live objects means walking everything the garbage collector
+    knows about, so this is not something to leave on all the time.
+
+    """
+    def __init__(self, stream=None, top=10):
+        if stream is None:
+            stream = sys.stderr
+        self.stream = stream
+        self.top = top
+        self.snapshot = None
+
+    def begin_chapter(self, chapter_num):
+        if tracemalloc is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def allocations(self, snapshot, group_by):
+        stats = snapshot.compare_to(self.snapshot, group_by)[:self.top]
+        return [{
+            'where': str(stat.traceback),
+            'size_diff': stat.size_diff,
+            'count_diff': stat.count_diff,
+        } for stat in stats]
+
+    def end_chapter(self, chapter_num, characters):
+        gc.collect()
+        counts = dict([(class_.__name__, 0) for class_ in COUNTED])
+        everything = gc.get_objects()
+        for obj in everything:
+            for class_ in COUNTED:
+                if isinstance(obj, class_):
+                    counts[class_.__name__] += 1
+        beliefs = {}
+        for character in characters:
+            (own, nested) = count_beliefs(character.beliefs)
+            beliefs[character.name] = {'beliefs': own, 'nested': nested}
+        report = {
+            'chapter': chapter_num,
+            'objects': counts,
+            'gc_objects': len(everything),
+            'beliefs': beliefs,
+            'max_rss_kb': None,
+            'by_line': None,
+            'by_file': None,
+        }
+        del everything
+        if resource is not None:
+            report['max_rss_kb'] = resource.getrusage(
+                resource.RUSAGE_SELF
+            ).ru_maxrss
+        if self.snapshot is not None:
+            snapshot = tracemalloc.take_snapshot()
+            report['by_line'] = self.allocations(snapshot, 'lineno')
+            report['by_file'] = self.allocations(snapshot, 'filename')
+            self.snapshot = None
+        self.stream.write(json.dumps(report, sort_keys=True) + "\n")
+        self.stream.flush()
@@ -1,7 +1,11 @@
-import random
+from array import array
+from collections import OrderedDict
 import sys
+import weakref
 
-from swallows.engine.events import Event
+from swallows.engine.event import Event
+from swallows.engine.rng import streams
+from swallows.engine.routing import router
 
 ### TOPICS ###
 
@@ -27,6 +31,18 @@ class QuestionTopic(Topic):
     pass
 
 
+# an Animate responds to a topic with whichever of its methods is marked,
+# with this decorator, as conversing about that class of topic (or the
+# nearest superclass of it that something is marked as conversing about.)
+# see Animate.converse.
+
+def converses_about(topic_class):
+    def decorate(method):
+        method.converses_about = topic_class
+        return method
+    return decorate
+
+
 ### BELIEFS ###
 
 #
@@ -123,6 +139,45 @@ class BeliefsBelief(Belief):
         )
 
 
+class BeliefGroup(dict):
+    """The beliefs (at most one of each Belief subclass) that a BeliefSet
+    holds about one particular subject.
+
+    BeliefGroups are never modified once made; a BeliefSet which wants to
+    change its beliefs about a subject makes a new BeliefGroup instead.
+    This lets identical BeliefGroups be shared between BeliefSets, which
+    they very often are: when Alice tells Bob where the dead body is,
+    Bob's idea of what Alice believes about the dead body is exactly
+    what Alice believes about it, and so is every other character's who
+    she's told.  So they all point at the same BeliefGroup, instead of
+    each having their own copy.
+
+    Use BeliefGroup.of to get the shared BeliefGroup for some beliefs.
+
+    """
+    interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def of(cls, beliefs):
+        """Given a dict mapping Belief subclasses to Beliefs, return the
+        BeliefGroup holding exactly those Beliefs.
+
+        """
+        if BeliefsBelief in beliefs:
+            # each of these holds its own mutable BeliefSet, so no two
+            # BeliefSets will ever have the same one.  don't bother.
+            return cls(beliefs)
+        key = frozenset(beliefs.iteritems())
+        group = cls.interned.get(key)
+        if group is None:
+            group = cls(beliefs)
+            cls.interned[key] = group
+        return group
+
+
+EMPTY_GROUP = BeliefGroup()
+
+
 class BeliefSet(object):
     """A BeliefSet works something like a Python set(), but has the
     following constraints:
@@ -131,35 +186,54 @@ class BeliefSet(object):
     item in the set.
 
     So it's really kind of a map from Actors to maps from Belief
-    subclasses to Beliefs.
+    subclasses to Beliefs.  (Those maps are BeliefGroups, which are
+    shared between BeliefSets whenever they have the same contents.)
 
     But it behooves us (or at least, me) to think of it as a set.
     (Besides, it might change.)
 
     """
+    # if set, called as watcher(belief_set, action, belief) whenever a
+    # belief is added or removed.  (see FlightRecorder.attach)
+    watcher = None
+
     def __init__(self):
         self.belief_map = {}
 
     def add(self, belief):
         assert isinstance(belief, Belief)
         subject = belief.subject
-        self.belief_map.setdefault(subject, {})[belief.__class__] = belief
+        beliefs = self.belief_map.get(subject, EMPTY_GROUP)
+        if beliefs.get(belief.__class__) is belief:
+            return
+        if self.watcher is not None:
+            self.watcher(self, 'add', belief)
+        beliefs = dict(beliefs)
+        beliefs[belief.__class__] = belief
+        self.belief_map[subject] = BeliefGroup.of(beliefs)
 
     def remove(self, belief):
         # the particular belief passed to us doesn't really matter.  we extract
         # the class and subject and return any existing belief we may have
         assert isinstance(belief, Belief)
         subject = belief.subject
-        beliefs = self.belief_map.setdefault(subject, {})
+        beliefs = self.belief_map.get(subject, EMPTY_GROUP)
         if belief.__class__ in beliefs:
-            del beliefs[belief.__class__]
+            if self.watcher is not None:
+                self.watcher(self, 'remove', beliefs[belief.__class__])
+            if len(beliefs) == 1:
+                del self.belief_map[subject]
+            else:
+                beliefs = dict(beliefs)
+                del beliefs[belief.__class__]
+                self.belief_map[subject] = BeliefGroup.of(beliefs)
 
     def get(self, belief):
         # the particular belief passed to us doesn't really matter.  we extract
         # the class and subject and return any existing belief we may have
         assert isinstance(belief, Belief)
         subject = belief.subject
-        return self.belief_map.setdefault(subject, {}).get(
+        return self.belief_map.get(subject, EMPTY_GROUP).get(
             belief.__class__, None
         )
 
@@ -168,9 +242,7 @@ class BeliefSet(object):
             yield subject
 
     def beliefs_for(self, subject):
-        beliefs = self.belief_map.setdefault(subject, {})
-        for class_ in beliefs:
-            yield beliefs[class_]
+        return self.belief_map.get(subject, EMPTY_GROUP).itervalues()
 
     def beliefs_of_class(self, class_):
         for subject in self.subjects():
@@ -185,44 +257,612 @@ class BeliefSet(object):
                 l.append(str(belief))
         return ', '.join(l)
 
+    def spawn(self):
+        """Return a new, empty BeliefSet of the same sort as this one.
+        Used for making the BeliefSets inside BeliefsBeliefs.
+
+        """
+        return BeliefSet()
+
+    def copy(self):
+        """Return a copy of this BeliefSet which can be changed without
+        affecting this one.  Since BeliefGroups are never changed, this
+        only has to copy the BeliefSets inside BeliefsBeliefs.
+
+        """
+        other = self.spawn()
+        self.copy_into(other)
+        return other
+
+    def copy_into(self, other):
+        for (subject, beliefs) in self.belief_map.iteritems():
+            if BeliefsBelief in beliefs:
+                beliefs = dict(beliefs)
+                beliefs_belief = beliefs[BeliefsBelief]
+                beliefs[BeliefsBelief] = BeliefsBelief(
+                    beliefs_belief.subject, beliefs_belief.belief_set.copy()
+                )
+                beliefs = BeliefGroup.of(beliefs)
+            other.belief_map[subject] = beliefs
+
+
+### EVICTION POLICIES ###
+
+# an eviction policy decides which belief a BoundedBeliefSet forgets when
+# it has become too full.  beliefs are identified by their "key", which is
+# (subject, class), since that's all a BeliefSet tells beliefs apart by.
+
+class EvictionPolicy(object):
+    def added(self, key, belief):
+        raise NotImplementedError
+
+    def recalled(self, key):
+        pass
+
+    def removed(self, key):
+        raise NotImplementedError
+
+    def copy(self):
+        raise NotImplementedError
+
+    def victim(self, keep):
+        """Return the key of the belief to forget next.  Should not be keep
+        (the belief just added) unless there's nothing else.
+
+        """
+        raise NotImplementedError
+
+
+class LeastRecentlyRecalled(EvictionPolicy):
+    """Forget whatever we've gone longest without thinking about."""
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def added(self, key, belief):
+        self.order.pop(key, None)
+        self.order[key] = True
+
+    def recalled(self, key):
+        if key in self.order:
+            del self.order[key]
+            self.order[key] = True
+
+    def removed(self, key):
+        self.order.pop(key, None)
+
+    def copy(self):
+        other = LeastRecentlyRecalled()
+        other.order = self.order.copy()
+        return other
+
+    def victim(self, keep):
+        for key in self.order:
+            if key != keep:
+                return key
+        return keep
+
+
+class OldestInformant(EvictionPolicy):
+    """Forget things we were told by others before things we found out
+    for ourselves; and within each of those, forget the oldest first.
+
+    """
+    def __init__(self):
+        self.hearsay = OrderedDict()
+        self.firsthand = OrderedDict()
+
+    def added(self, key, belief):
+        self.removed(key)
+        if getattr(belief, 'informant', None) is not None:
+            self.hearsay[key] = True
+        else:
+            self.firsthand[key] = True
+
+    def removed(self, key):
+        self.hearsay.pop(key, None)
+        self.firsthand.pop(key, None)
+
+    def copy(self):
+        other = OldestInformant()
+        other.hearsay = self.hearsay.copy()
+        other.firsthand = self.firsthand.copy()
+        return other
+
+    def victim(self, keep):
+        for order in (self.hearsay, self.firsthand):
+            for key in order:
+                if key != keep:
+                    return key
+        return keep
+
+
+class BoundedBeliefSet(BeliefSet):
+    """A BeliefSet which holds at most capacity beliefs.  When adding a
+    belief would take it over capacity, it forgets one, chosen by the
+    eviction policy (policy is a class, or any callable returning an
+    EvictionPolicy.)  Each forgotten belief is passed to on_evict, if
+    given, and counted in self.evictions.
+
+    BeliefSets spawned from a BoundedBeliefSet are likewise bounded,
+    and report to the same on_evict.
+
+    """
+    def __init__(self, capacity, policy=LeastRecentlyRecalled, on_evict=None):
+        BeliefSet.__init__(self)
+        assert capacity > 0
+        self.capacity = capacity
+        self.policy_class = policy
+        self.policy = policy()
+        self.on_evict = on_evict
+        self.size = 0
+        self.evictions = 0
+
+    def add(self, belief):
+        key = (belief.subject, belief.__class__)
+        if BeliefSet.get(self, belief) is None:
+            self.size += 1
+        BeliefSet.add(self, belief)
+        self.policy.added(key, belief)
+        while self.size > self.capacity:
+            (subject, class_) = self.policy.victim(key)
+            victim = self.belief_map[subject][class_]
+            self.remove(victim)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(victim)
+
+    def remove(self, belief):
+        if BeliefSet.get(self, belief) is not None:
+            self.size -= 1
+            self.policy.removed((belief.subject, belief.__class__))
+        BeliefSet.remove(self, belief)
+
+    def get(self, belief):
+        found = BeliefSet.get(self, belief)
+        if found is not None:
+            self.policy.recalled((belief.subject, belief.__class__))
+        return found
+
+    def spawn(self):
+        return BoundedBeliefSet(
+            self.capacity, policy=self.policy_class, on_evict=self.on_evict
+        )
+
+    def add_all(self, belief_set):
+        """Add every belief in the given BeliefSet to this one (evicting
+        as need be.)  The BeliefSets inside its BeliefsBeliefs are copied
+        into bounded ones spawned from this one, so that what we think
+        others believe is bounded too, all the way down.
+
+        """
+        for subject in list(belief_set.subjects()):
+            for belief in list(belief_set.beliefs_for(subject)):
+                if isinstance(belief, BeliefsBelief):
+                    nested = self.spawn()
+                    nested.add_all(belief.belief_set)
+                    belief = BeliefsBelief(belief.subject, nested)
+                self.add(belief)
+
+    def copy(self):
+        other = BeliefSet.copy(self)
+        other.policy = self.policy.copy()
+        other.size = self.size
+        other.evictions = self.evictions
+        return other
+
+
+### REGISTRY ###
+
+NOWHERE = -1
+
+
+class Registry(object):
+    """Every Actor is registered here when it is created, and is given a
+    dense integer id (which is just its index in self.actors.)
+
+    The parts of the world's state that change as the story goes on --
+    where each actor is, who owns it, and which animate (if any) is
+    carrying it -- are mirrored here in compact arrays of ids, indexed by
+    actor id.  NOWHERE stands in for None.  This makes taking a snapshot of
+    the world, comparing two snapshots, or writing one out, a matter of
+    copying arrays instead of walking the object graph.
+
+    The arrays are kept in sync by Actor.move_to, Animate.move_to,
+    Animate.place_in, and by assigning to Actor.owner; which covers
+    pick_up, put_down, give_to and friends, as they all go through move_to.
+
+    The registry also keeps an index of the containment tree (things in
+    containers in rooms, things carried by animates, and so on), so that
+    root(), holder() and treasures_under() can be answered without
+    walking contents and location by hand.  It's updated as things move:
+    moving something costs the size of what it contains, plus the depth
+    of where it's going, which for our worlds is next to nothing.
+
+    """
+    def __init__(self):
+        self.actors = []
+        self.location_of = array('l')
+        self.owner_of = array('l')
+        self.carried_by = array('l')
+        # owner id -> set of ids of the actors it owns
+        self.owned = {}
+        # the outermost location each actor is in (a location that isn't
+        # in anything is its own root), and the innermost animate (if any)
+        # that it is in
+        self.root_of = array('l')
+        self.holder_of = array('l')
+        # id -> set of ids of the treasures anywhere inside that actor
+        self.treasures = {}
+        # the ids of the actors indexed as treasures.  whether something
+        # is one is asked again each time it moves (see ActorType), so
+        # this is what was said the last time.
+        self.treasure_ids = set()
+
+    def register(self, actor):
+        actor.id = len(self.actors)
+        self.actors.append(actor)
+        self.location_of.append(NOWHERE)
+        self.owner_of.append(NOWHERE)
+        self.carried_by.append(NOWHERE)
+        if isinstance(actor, Location):
+            self.root_of.append(actor.id)
+        else:
+            self.root_of.append(NOWHERE)
+        self.holder_of.append(NOWHERE)
+
+    def __len__(self):
+        return len(self.actors)
+
+    def __getitem__(self, id):
+        return self.actors[id]
+
+    def relocated(self, actor):
+        location = actor.location
+        # the treasures that are moving: whatever is inside the actor, and
+        # the actor itself, if it is one.  they're no longer under anything
+        # the actor used to be under, and are now under everything it is.
+        # (the actor was indexed as it was the last time it moved; it's
+        # taken out as that, and put back as whatever it is now.)
+        under = self.treasures.get(actor.id)
+        moving = under
+        if actor.id in self.treasure_ids:
+            moving = set(under or ())
+            moving.add(actor.id)
+        if moving:
+            self.untreasure(self.location_of[actor.id], moving)
+        moving = under
+        if actor.is_treasure:
+            self.treasure_ids.add(actor.id)
+            moving = set(under or ())
+            moving.add(actor.id)
+        else:
+            self.treasure_ids.discard(actor.id)
+        if location is None:
+            self.location_of[actor.id] = NOWHERE
+            self.carried_by[actor.id] = NOWHERE
+        else:
+            self.location_of[actor.id] = location.id
+            if location.is_animate:
+                self.carried_by[actor.id] = location.id
+            else:
+                self.carried_by[actor.id] = NOWHERE
+            if moving:
+                self.entreasure(location.id, moving)
+        self.rerooted(actor)
+
+    def untreasure(self, id, treasures):
+        while id != NOWHERE:
+            under = self.treasures.get(id)
+            if under is not None:
+                under.difference_update(treasures)
+                if not under:
+                    del self.treasures[id]
+            id = self.location_of[id]
+
+    def entreasure(self, id, treasures):
+        while id != NOWHERE:
+            self.treasures.setdefault(id, set()).update(treasures)
+            id = self.location_of[id]
+
+    def rerooted(self, actor):
+        """Work out the root and holder of the given actor from those of
+        its location, and then of everything inside it.
+
+        """
+        root_of = self.root_of
+        holder_of = self.holder_of
+        location = actor.location
+        if location is None:
+            if isinstance(actor, Location):
+                root_of[actor.id] = actor.id
+            else:
+                root_of[actor.id] = NOWHERE
+            holder_of[actor.id] = NOWHERE
+        else:
+            root_of[actor.id] = root_of[location.id]
+            if location.is_animate:
+                holder_of[actor.id] = location.id
+            else:
+                holder_of[actor.id] = holder_of[location.id]
+        pending = [actor]
+        while pending:
+            container = pending.pop()
+            if not container.contents:
+                continue
+            root = root_of[container.id]
+            if container.is_animate:
+                holder = container.id
+            else:
+                holder = holder_of[container.id]
+            for x in container.contents:
+                root_of[x.id] = root
+                holder_of[x.id] = holder
+                pending.append(x)
+
+    def reindex(self):
+        """Rebuild the index of the containment tree from scratch."""
+        self.treasures = {}
+        self.treasure_ids = set()
+        for actor in self.actors:
+            if actor.location is None:
+                self.rerooted(actor)
+            if actor.is_treasure:
+                self.treasure_ids.add(actor.id)
+                self.entreasure(self.location_of[actor.id], (actor.id,))
+
+    def root(self, actor):
+        """Return the outermost Location the given actor is in (which is
+        the actor itself, for a Location that isn't in anything), or None.
+
+        """
+        id = self.root_of[actor.id]
+        if id == NOWHERE:
+            return None
+        return self.actors[id]
+
+    def holder(self, actor):
+        """Return the animate that has the given actor, directly or in
+        something they have, or None if it is not being carried.
+
+        """
+        id = self.holder_of[actor.id]
+        if id == NOWHERE:
+            return None
+        return self.actors[id]
+
+    def treasures_under(self, actor):
+        """Return the treasures anywhere inside the given actor, in the
+        order they were registered (as a list; or () if there are none.)
+
+        """
+        under = self.treasures.get(actor.id)
+        if not under:
+            return ()
+        return [self.actors[id] for id in sorted(under)]
+
+    def reowned(self, actor):
+        owner = actor.owner
+        old_owner_id = self.owner_of[actor.id]
+        if old_owner_id != NOWHERE:
+            self.owned[old_owner_id].discard(actor.id)
+        if owner is None:
+            self.owner_of[actor.id] = NOWHERE
+        else:
+            self.owner_of[actor.id] = owner.id
+            self.owned.setdefault(owner.id, set()).add(actor.id)
+
+    def owned_by(self, actor):
+        return [self.actors[id] for id in sorted(self.owned.get(actor.id, ()))]
+
+    def snapshot(self):
+        """Return a copy of the mutable state of the world, as a tuple of
+        arrays.  It is only valid for actors registered at the time it was
+        taken.
+
+        """
+        return (array('l', self.location_of),
+                array('l', self.owner_of),
+                array('l', self.carried_by))
+
+    def diff(self, old, new):
+        """Return a list of the ids of actors whose state differs between
+        the two given snapshots.
+
+        """
+        changed = []
+        for (a, b) in zip(old, new):
+            for id in xrange(min(len(a), len(b))):
+                if a[id] != b[id]:
+                    changed.append(id)
+        return sorted(set(changed))
+
+    def restore(self, snapshot):
+        """Put every actor back where the given snapshot says it was.
+        Actors registered after the snapshot was taken are left alone.
+
+        """
+        (location_of, owner_of, carried_by) = snapshot
+        count = len(location_of)
+        for actor in self.actors[:count]:
+            if actor.contents:
+                actor.contents.clear()
+        for id in xrange(count):
+            actor = self.actors[id]
+            location_id = location_of[id]
+            if location_id == NOWHERE:
+                actor.location = None
+            else:
+                actor.location = self.actors[location_id]
+                actor.location.contents.add(actor)
+            owner_id = owner_of[id]
+            owner = None if owner_id == NOWHERE else self.actors[owner_id]
+            if actor.owner is not owner:
+                actor.owner = owner
+        self.location_of[:count] = location_of
+        self.carried_by[:count] = carried_by
+        self.reindex()
+
+    def serialize(self, snapshot):
+        """Return the given snapshot as a string of bytes, suitable for
+        writing to a file and reading back with deserialize.
+
+        """
+        return ''.join([a.tostring() for a in snapshot])
+
+    def deserialize(self, data):
+        size = len(data) // 3
+        return tuple([array('l', data[i * size:(i + 1) * size])
+                      for i in xrange(3)])
+
+
+# the registry that all actors are registered in.  there is only one world.
+registry = Registry()
+
 
 ### ACTORS (objects in the world) ###
 
+# there can be an awful lot of actors in a big world, so they're laid out
+# with __slots__ (and so subclasses here should have __slots__ too, even
+# if it's empty, or they'll get a __dict__ back.)  only the kinds of
+# actors that can have things in them get a contents set; for everything
+# else, contents is the same empty frozenset.
+#
+# what kind of thing an actor is (treasure, weapon, and so on) is what its
+# treasure(), weapon()... methods say.  but asking means a method call, and
+# the engine asks a lot, so each also has a class-level flag (is_treasure,
+# and so on) which the engine looks at instead.  to make a new kind of
+# thing, it's enough to set the flag; the method answers from it.  a class
+# that overrides the method instead (to decide for each instance, say) has
+# the flag turned into a property that asks the method, by ActorType, so
+# that the engine still gets the method's answer.  (the registry's index of
+# treasures asks when something moves; a thing that becomes a treasure
+# while it sits still isn't indexed as one until it next moves.)
+
+KINDS = ('treasure', 'weapon', 'horror', 'takeable', 'animate', 'container')
+
+
+def kind_method(kind):
+    """Make the default method for the given kind, which answers from the
+    flag the class (or the nearest of its bases) sets for it.
+
+    """
+    def method(self):
+        return self.declared_kinds[kind]
+    method.__name__ = kind
+    method.answers_from_flag = True
+    return method
+
+
+def kind_property(kind):
+    """Make the property that stands in for the given kind's flag, in a
+    class that overrides the kind's method.
+
+    """
+    def get(self):
+        return getattr(self, kind)()
+    return property(get)
+
+
+class ActorType(type):
+    """The metaclass of Actor, which keeps the is_ flags of each class in
+    agreement with its kind methods (see above.)  Whichever of the flag and
+    the method is given by the more derived class wins, and the other is
+    made to agree with it: a flag set below an overridden method gets the
+    default method back (which answers from the flag), and a method
+    overridden below (or alongside) a flag gets the flag made a property.
+
+    """
+    def __init__(cls, name, bases, namespace):
+        super(ActorType, cls).__init__(name, bases, namespace)
+        mro = cls.__mro__
+        declared = {}
+        for kind in KINDS:
+            flag = 'is_' + kind
+            method_owner = [c for c in mro if kind in c.__dict__][0]
+            flag_owner = [c for c in mro if flag in c.__dict__ and
+                          not isinstance(c.__dict__[flag], property)][0]
+            declared[kind] = flag_owner.__dict__[flag]
+            overridden = not getattr(method_owner.__dict__[kind],
+                                     'answers_from_flag', False)
+            if not overridden:
+                continue
+            if mro.index(method_owner) <= mro.index(flag_owner):
+                setattr(cls, flag, kind_property(kind))
+            else:
+                setattr(cls, kind, kind_method(kind))
+        cls.declared_kinds = declared
+
+
 class Actor(object):
+    __metaclass__ = ActorType
+    __slots__ = ('id', '_name', '_owner', '_forms', 'collector', 'location')
+
+    is_treasure = False
+    is_weapon = False
+    is_horror = False
+    is_takeable = False
+    is_animate = False
+    is_container = False
+    can_contain = False
+
+    contents = frozenset()
+    enter = ""
+
     def __init__(self, name, location=None, owner=None, collector=None):
+        registry.register(self)
+        self._forms = None
         self.name = name
         self.collector = collector
-        self.contents = set()
-        self.enter = ""
+        if self.can_contain:
+            self.contents = set()
         self.owner = owner
         self.location = None
         if location is not None:
             self.move_to(location)
 
-    def notable(self):
-        return self.treasure() or self.weapon() or self.animate() or self.horror()
+    def _get_owner(self):
+        return self._owner
 
-    def treasure(self):
-        return False
+    def _set_owner(self, owner):
+        self._owner = owner
+        registry.reowned(self)
+        self.forms_changed()
 
-    def weapon(self):
-        return False
+    owner = property(_get_owner, _set_owner)
 
-    def horror(self):
-        return False
+    def _get_name(self):
+        return self._name
 
-    def takeable(self):
-        return False
+    def _set_name(self, name):
+        self._name = name
+        self.forms_changed()
 
-    def animate(self):
-        return False
+    name = property(_get_name, _set_name)
 
-    def container(self):
-        return False
+    # hash by registry id, not by memory address, so that iterating over
+    # sets of actors (like contents) goes in the same order on every run,
+    # and a seeded story comes out the same every time.
+    def __hash__(self):
+        return self.id
+
+    def notable(self):
+        return self.is_treasure or self.is_weapon or self.is_animate or self.is_horror
+
+    treasure = kind_method('treasure')
+    weapon = kind_method('weapon')
+    horror = kind_method('horror')
+    takeable = kind_method('takeable')
+    animate = kind_method('animate')
+    container = kind_method('container')
 
     def article(self):
         return 'the'
 
+    def indefinite_article(self):
+        if self.name.startswith(('a', 'e', 'i', 'o', 'u')):
+            return 'an'
+        return 'a'
+
     def posessive(self):
         return "its"
 
@@ -238,54 +878,128 @@ class Actor(object):
     def is_(self):
         return "is"
 
-    def emit(self, *args, **kwargs):
-        if self.collector:
-            self.collector.collect(Event(*args, **kwargs))
+    def emit(self, phrase, participants, *args, **kwargs):
+        collector = self.collector
+        if collector:
+            # an event that can be heard elsewhere gets made regardless,
+            # as hearing it might make someone do something
+            if not (kwargs.get('radius') or
+                    collector.wants(phrase, participants)):
+                return
+            event = Event(phrase, participants, *args, **kwargs)
+            collector.collect(event)
+            if event.radius:
+                self.broadcast(event)
+
+    def broadcast(self, event):
+        """Let every animate within earshot of the event (other than the
+        participants) know that it happened.
+
+        """
+        for (location, distance) in router.neighbourhood(
+                event.location, event.radius):
+            for x in list(location.contents):
+                if x.is_animate and x not in event.participants:
+                    x.hear(event, distance)
 
     def move_to(self, location):
         if self.location:
             self.location.contents.remove(self)
         self.location = location
         self.location.contents.add(self)
+        registry.relocated(self)
+
+    ###--- surface forms ---###
+
+    # everything we might be called in a sentence is worked out once, and
+    # kept in a table, until our name or owner changes (or the name or
+    # owner of our owner, since "<*> bed" might be "Bob's bed".)
+
+    def forms_changed(self):
+        """Forget our surface forms, and those of everything we own."""
+        self._forms = None
+        for actor in registry.owned_by(self):
+            actor.forms_changed()
+
+    def forms(self):
+        """Return a dict of the ways we can be referred to:
+        - 'definite': the generic description (see render)
+        - 'my', 'your', 'owners': with our owner's part of the name
+          given from the point of view of our owner speaking, being spoken
+          to, or doing something with us
+        - 'indef': with an indefinite article (see indefinite)
+        - 'his', 'him', 'he', 'was', 'is': the posessive, accusative and
+          pronoun that stand for us, and the verb forms that agree with us
+
+        """
+        forms = self._forms
+        if forms is None:
+            forms = self._forms = self.compute_forms()
+        return forms
+
+    def compute_forms(self):
+        name = self.name
+        article = self.article()
+        def phrase(repl):
+            if repl is not None:
+                named = name.replace('<*>', repl)
+            else:
+                named = name
+            if not article:
+                return named
+            return '%s %s' % (article, named)
+        owner = self.owner
+        return {
+            'definite': phrase(
+                None if owner is None else owner.render() + "'s"
+            ),
+            'my': phrase('my'),
+            'your': phrase('your'),
+            'owners': None if owner is None else phrase(owner.posessive()),
+            'indef': self.indefinite(),
+            'his': self.posessive(),
+            'him': self.accusative(),
+            'he': self.pronoun(),
+            'was': self.was(),
+            'is': self.is_(),
+        }
 
     def render(self, event=None):
         """Return a string containing what we call this object, in the context
         of the given event (which may be None, to get a 'generic' description.)
 
         """
-        name = self.name
-        repl = None
-        if self.owner is not None:
-            repl = self.owner.render() + "'s"
-        if event:
-            if event.speaker is self.owner:
-                repl = 'my'
-            elif event.addressed_to is self.owner:
-                repl = 'your'
-            elif event.initiator() is self.owner:
-                repl = event.initiator().posessive()
-        if repl is not None:
-            name = name.replace('<*>', repl)
-        article = self.article()
-        if not article:
-            return name
-        return '%s %s' % (article, name)
+        forms = self._forms
+        if forms is None:
+            forms = self.forms()
+        if event is not None:
+            owner = self._owner
+            if event.speaker is owner:
+                return forms['my']
+            elif event.addressed_to is owner:
+                return forms['your']
+            elif event.initiator() is owner:
+                return forms['owners']
+        return forms['definite']
 
     def indefinite(self):
-        article = 'a'
-        if self.name.startswith(('a', 'e', 'i', 'o', 'u')):
-            article = 'an'
-        return '%s %s' % (article, self.name)
+        # (compute_forms asks this, so that overriding it changes what
+        # <indef-1> and the like render as, too)
+        return '%s %s' % (self.indefinite_article(), self.name)
 
 
 ### some mixins for Actors ###
 
 class ProperMixin(object):
+    __slots__ = ()
+
     def article(self):
         return ''
 
 
 class PluralMixin(object):
+    __slots__ = ()
+
     def posessive(self):
         return "their"
 
@@ -295,9 +1009,8 @@ class PluralMixin(object):
     def pronoun(self):
         return "they"
 
-    def indefinite(self):
-        article = 'some'
-        return '%s %s' % (article, self.name)
+    def indefinite_article(self):
+        return 'some'
 
     def was(self):
         return "were"
@@ -307,6 +1020,8 @@ class PluralMixin(object):
 
 
 class MasculineMixin(object):
+    __slots__ = ()
+
     def posessive(self):
         return "his"
 
@@ -318,6 +1033,8 @@ class MasculineMixin(object):
 
 
 class FeminineMixin(object):
+    __slots__ = ()
+
     def posessive(self):
         return "her"
 
@@ -331,15 +1048,70 @@ class FeminineMixin(object):
 ### ANIMATE OBJECTS ###
 
 class Animate(Actor):
+    __slots__ = ('contents', 'topic', 'beliefs', 'evictions', 'rng', 'runtime')
+
+    is_animate = True
+    can_contain = True
+
     def __init__(self, name, location=None, owner=None, collector=None):
         Actor.__init__(
             self, name, location=location, owner=owner, collector=None
         )
+        # the Scheduler running this Animate as a coroutine, if any
+        self.runtime = None
         self.topic = None
         self.beliefs = BeliefSet()
+        self.evictions = 0
+        # where this Animate's decisions come from.  the Publisher gives
+        # each character a stream of its own; see swallows.engine.rng.
+        self.rng = streams.stream('%s#%d' % (name, self.id))
 
-    def animate(self):
-        return True
+    def limit_beliefs(self, capacity, policy=LeastRecentlyRecalled):
+        """Make this Animate's memory hold at most capacity beliefs
+        (and likewise each set of beliefs it thinks others hold.)  When
+        it would hold more, it forgets some, chosen by the given eviction
+        policy, and is told about it by a call to evicted.
+
+        """
+        beliefs = BoundedBeliefSet(capacity, policy=policy,
+                                   on_evict=self.evicted)
+        beliefs.add_all(self.beliefs)
+        self.replace_beliefs(beliefs)
+
+    def replace_beliefs(self, beliefs):
+        """Make the given BeliefSet this Animate's beliefs, in place of
+        the one it has; whatever was watching the old one (see
+        FlightRecorder.attach) watches the new one.
+
+        """
+        watcher = self.beliefs.watcher
+        if watcher is not None:
+            beliefs.watcher = watcher
+        self.beliefs = beliefs
+
+    def evicted(self, belief):
+        """Called when limited memory has made us forget a belief."""
+        self.evictions += 1
+
+    def get_state(self):
+        """Return a copy of this Animate's state of mind (but not of where
+        it is or what it's carrying; the registry takes care of that.)
+        Subclasses with more state should extend this and set_state.
+
+        """
+        return {
+            'beliefs': self.beliefs.copy(),
+            'topic': self.topic,
+            'evictions': self.evictions,
+            'rng': self.rng.getstate(),
+        }
+
+    def set_state(self, state):
+        # copy again, so the same state can be restored more than once
+        self.replace_beliefs(state['beliefs'].copy())
+        self.topic = state['topic']
+        self.evictions = state['evictions']
+        self.rng.setstate(state['rng'])
 
     # for debugging
     def dump_beliefs(self):
@@ -385,9 +1157,9 @@ class Animate(Actor):
         self.beliefs.remove(Desire(thing))
 
     def does_desire(self, thing):
-        if thing.treasure():
+        if thing.is_treasure:
             return True  # omg YES
-        if thing.weapon():
+        if thing.is_weapon:
             return True  # could come in handy.  (TODO, sophisticate this?)
         return self.beliefs.get(Desire(thing)) is not None
 
@@ -403,16 +1175,67 @@ class Animate(Actor):
         # for extra fun, try reading the code of this method out loud!
         beliefs_belief = self.beliefs.get(BeliefsBelief(other))
         if beliefs_belief is None:
-            beliefs_belief = BeliefsBelief(other, BeliefSet())
+            beliefs_belief = BeliefsBelief(other, self.beliefs.spawn())
             self.beliefs.add(beliefs_belief)
         return beliefs_belief.belief_set
 
+    def hear(self, event, distance):
+        """Called when an event with a radius happens the given number of
+        exits away from us (which may be 0, if it happened right here.)
+        By default, we don't react.
+
+        """
+        pass
+
     ###--- topic stuff ---###
 
+    # maps (Animate subclass, Topic subclass) to the name of the method
+    # that handles it, or None.  filled in as needed by topic_handler.
+    topic_handlers = {}
+
+    @classmethod
+    def topic_handler(cls, topic_class):
+        """Return the name of the method that instances of this class use
+        to converse about topics of the given class, or None.
+
+        """
+        key = (cls, topic_class)
+        try:
+            return Animate.topic_handlers[key]
+        except KeyError:
+            pass
+        handlers = {}
+        for class_ in reversed(cls.__mro__):
+            for (name, value) in class_.__dict__.iteritems():
+                handled = getattr(value, 'converses_about', None)
+                if handled is not None:
+                    handlers[handled] = name
+        handler = None
+        for class_ in topic_class.__mro__:
+            if class_ in handlers:
+                handler = handlers[class_]
+                break
+        Animate.topic_handlers[key] = handler
+        return handler
+
+    def converse(self, topic):
+        """Respond to a topic that has been addressed to us.  Methods
+        decorated with converses_about say which topics they respond to,
+        so subclasses can add to or override these responses one topic
+        at a time.
+
+        """
+        self.topic = None
+        handler = self.topic_handler(topic.__class__)
+        if handler is not None:
+            getattr(self, handler)(topic)
+
     def address(self, other, topic, phrase, participants=None):
         if participants is None:
             participants = [self, other]
         other.topic = topic
+        if other.runtime is not None:
+            other.runtime.deliver(other)
         self.emit(phrase, participants, speaker=self, addressed_to=other)
 
     def greet(self, other, phrase, participants=None):
@@ -434,6 +1257,7 @@ class Animate(Actor):
             self.location.contents.remove(self)
         self.location = location
         self.location.contents.add(self)
+        registry.relocated(self)
         # this is needed so that the Editor knows where the character starts.
         # the Editor should (does?) strip out all instances of these that
         # aren't informative to the reader.
@@ -454,7 +1278,7 @@ class Animate(Actor):
             # otherwise we get "Bob saw Bob leave the room", eh?
             if x is self:
                 continue
-            if x.animate():
+            if x.is_animate and x.watches(self):
                 x.emit("<1> saw <2> leave the %s" % x.location.noun(), [x, self])
         if self.location is not None:
             self.location.contents.remove(self)
@@ -462,9 +1286,17 @@ class Animate(Actor):
         self.location = location
         assert self not in self.location.contents
         self.location.contents.add(self)
+        registry.relocated(self)
         self.emit("<1> went to <2>", [self, self.location],
                   previous_location=previous_location)
 
+    def watches(self, other):
+        """Return whether we remark on the given Animate leaving the room
+        we're in.
+
+        """
+        return True
+
     def point_at(self, other, item):
         # it would be nice if there was some way to
         # indicate the revolver as part of the Topic which will follow,
@@ -475,7 +1307,7 @@ class Animate(Actor):
         self.emit("<1> pointed <3> at <2>",
             [self, other, item])
         for actor in self.location.contents:
-            if actor.animate():
+            if actor.is_animate:
                 actor.remember_location(item, self)
 
     def put_down(self, item):
@@ -483,7 +1315,7 @@ class Animate(Actor):
         self.emit("<1> put down <2>", [self, item])
         item.move_to(self.location)
         for actor in self.location.contents:
-            if actor.animate():
+            if actor.is_animate:
                 actor.remember_location(item, self.location)
 
     def pick_up(self, item):
@@ -491,7 +1323,7 @@ class Animate(Actor):
         self.emit("<1> picked up <2>", [self, item])
         item.move_to(self)
         for actor in self.location.contents:
-            if actor.animate():
+            if actor.is_animate:
                 actor.remember_location(item, self)
 
     def give_to(self, other, item):
@@ -500,16 +1332,39 @@ class Animate(Actor):
         self.emit("<1> gave <3> to <2>", [self, other, item])
         item.move_to(other)
         for actor in self.location.contents:
-            if actor.animate():
+            if actor.is_animate:
                 actor.remember_location(item, other)
 
     def wander(self):
         self.move_to(
             self.location.exits[
-                random.randint(0, len(self.location.exits)-1)
+                self.rng.randint(0, len(self.location.exits)-1)
             ]
         )
 
+    def head_towards(self, destination):
+        """Take one step along a shortest path to the given Location.
+        Returns False (and does not move) if we're already there, or
+        if there is no way to get there from here.
+
+        """
+        step = router.next_step(self.location, destination)
+        if step is None:
+            return False
+        self.move_to(step)
+        return True
+
+    def run(self):
+        """When the characters are run as coroutines (see
+        swallows.engine.runtime), this is the coroutine.  It yields after
+        each action; by default, it just lives, and yields, forever.
+        Subclasses can yield Sleep or WaitForTopic to be resumed later.
+
+        """
+        while True:
+            self.live()
+            yield
+
     def live(self):
         """This gets called on each turn an animate moves.
         
@@ -522,21 +1377,28 @@ class Animate(Actor):
 
 
 class Male(MasculineMixin, ProperMixin, Animate):
-    pass
+    __slots__ = ()
 
 
 class Female(FeminineMixin, ProperMixin, Animate):
-    pass
+    __slots__ = ()
 
 
 ### LOCATIONS ###
 
 class Location(Actor):
+    __slots__ = ('contents', 'enter', 'exits', 'noun_')
+
+    can_contain = True
+
     def __init__(self, name, enter="went to", noun="room", owner=None):
+        registry.register(self)
+        self._forms = None
+        self.location = None
         self.name = name
         self.enter = enter
         self.contents = set()
-        self.exits = []
+        self.exits = ()
         self.noun_ = noun
         self.owner = owner
 
@@ -546,43 +1408,51 @@ class Location(Actor):
     def set_exits(self, *exits):
         for exit in exits:
             assert isinstance(exit, Location)
+        router.exits_changed(self, self.exits, exits)
         self.exits = exits
 
+    def add_exits(self, *exits):
+        """Like set_exits, but keeps the exits this Location already has."""
+        self.set_exits(*(tuple(self.exits) + tuple(
+            [exit for exit in exits if exit not in self.exits]
+        )))
+
 
 class ProperLocation(ProperMixin, Location):
-    pass
+    __slots__ = ()
 
 
 ### OTHER INANIMATE OBJECTS ###
 
 class Item(Actor):
-    def takeable(self):
-        return True
+    __slots__ = ()
+    is_takeable = True
 
 
 class Weapon(Item):
-    def weapon(self):
-        return True
+    __slots__ = ()
+    is_weapon = True
 
 
 class Container(Actor):
-    def container(self):
-        return True
+    __slots__ = ('contents',)
+    is_container = True
+    can_contain = True
 
 
 class ProperContainer(ProperMixin, Container):
-    pass
+    __slots__ = ()
 
 
 class Treasure(Item):
-    def treasure(self):
-        return True
+    __slots__ = ()
+    is_treasure = True
 
 
 class PluralTreasure(PluralMixin, Treasure):
-    pass
+    __slots__ = ()
 
 
 class Horror(Actor):
-    def horror(self):
-        return True
+    __slots__ = ()
+    is_horror = True
@@ -0,0 +1,116 @@
+### QUERYING EVENTS ###
+
+class EventIndex(object):
+    """Indexes a list of events (say, a chapter's worth from an
+    EventCollector, or a log replayed from a ChapterHistory) so that
+    queries like "every event involving the revolver in the study" don't
+    have to look at every event.
+
+    Each event is indexed by its initiator, by each of its participants,
+    by its location, by its phrase, by its speaker and who it's addressed
+    to, and by whether it is exciting.  The values indexed are the ones
+    the event had when it was added; the Editor may change events later
+    (rewriting their phrases and so forth), but that won't confuse us.
+
+    """
+    def __init__(self, events=()):
+        self.events = []
+        self.records = []
+        self.by_initiator = {}
+        self.by_participant = {}
+        self.by_location = {}
+        self.by_phrase = {}
+        self.by_speaker = {}
+        self.by_addressed_to = {}
+        self.exciting = []
+        for event in events:
+            self.add(event)
+
+    def add(self, event):
+        index = len(self.events)
+        participants = frozenset(event.participants)
+        record = (event.initiator(), participants, event.location,
+                  event.phrase, event.speaker, event.addressed_to,
+                  event.exciting)
+        self.events.append(event)
+        self.records.append(record)
+        self.by_initiator.setdefault(record[0], []).append(index)
+        for participant in participants:
+            self.by_participant.setdefault(participant, []).append(index)
+        self.by_location.setdefault(record[2], []).append(index)
+        self.by_phrase.setdefault(record[3], []).append(index)
+        if record[4] is not None:
+            self.by_speaker.setdefault(record[4], []).append(index)
+        if record[5] is not None:
+            self.by_addressed_to.setdefault(record[5], []).append(index)
+        if record[6]:
+            self.exciting.append(index)
+
+    def __len__(self):
+        return len(self.events)
+
+    def positions(self, initiator=None, participants=(), location=None,
+                  phrase=None, speaker=None, addressed_to=None,
+                  exciting=None):
+        """Return, in order, the positions of the events matching all of
+        the given criteria.  participants is a sequence of actors which
+        must all have participated.
+
+        Works by walking the shortest index among the criteria given, and
+        checking the rest against each event found there; so it takes time
+        proportional to the number of events matching the most selective
+        criterion, which is usually not many more than are returned.
+
+        """
+        candidates = None
+        if initiator is not None:
+            candidates = self._shortest(candidates, self.by_initiator.get(initiator, []))
+        for participant in participants:
+            candidates = self._shortest(candidates, self.by_participant.get(participant, []))
+        if location is not None:
+            candidates = self._shortest(candidates, self.by_location.get(location, []))
+        if phrase is not None:
+            candidates = self._shortest(candidates, self.by_phrase.get(phrase, []))
+        if speaker is not None:
+            candidates = self._shortest(candidates, self.by_speaker.get(speaker, []))
+        if addressed_to is not None:
+            candidates = self._shortest(candidates, self.by_addressed_to.get(addressed_to, []))
+        if exciting:
+            candidates = self._shortest(candidates, self.exciting)
+        if candidates is None:
+            candidates = xrange(len(self.events))
+
+        positions = []
+        for index in candidates:
+            (r_initiator, r_participants, r_location, r_phrase,
+             r_speaker, r_addressed_to, r_exciting) = self.records[index]
+            if initiator is not None and r_initiator is not initiator:
+                continue
+            if location is not None and r_location is not location:
+                continue
+            if phrase is not None and r_phrase != phrase:
+                continue
+            if speaker is not None and r_speaker is not speaker:
+                continue
+            if addressed_to is not None and r_addressed_to is not addressed_to:
+                continue
+            if exciting is not None and bool(r_exciting) != bool(exciting):
+                continue
+            missing = False
+            for participant in participants:
+                if participant not in r_participants:
+                    missing = True
+                    break
+            if missing:
+                continue
+            positions.append(index)
+        return positions
+
+    def _shortest(self, candidates, postings):
+        if candidates is None or len(postings) < len(candidates):
+            return postings
+        return candidates
+
+    def select(self, **criteria):
+        """Like positions(), but return the events themselves."""
+        return [self.events[index] for index in self.positions(**criteria)]
@@ -0,0 +1,80 @@
+from collections import deque
+import sys
+
+### FLIGHT RECORDER ###
+
+class FlightRecorder(object):
+    """Keeps, for each character, the last `size` events they initiated
+    and changes to their beliefs, in a ring buffer, so that when something
+    goes wrong there is some idea of what led up to it.
+
+    Recording is cheap -- a tuple appended to a bounded deque -- so it can
+    be left on all the time.  Nothing is rendered until dump() is called,
+    which the Publisher does when an assertion fails (or you can do it
+    yourself, whenever you like.)
+
+    Only changes to a character's own BeliefSet are recorded, not changes
+    to the BeliefSets inside their BeliefsBeliefs.
+
+    Anyone else who initiates events (extras in a Crowd, say) gets a
+    buffer too, but only until the next chapter begins, so there are never
+    more buffers than there are actors taking part in one chapter.
+
+    """
+    def __init__(self, size=32):
+        self.size = size
+        self.buffers = {}
+
+    def buffer(self, actor):
+        buffer = self.buffers.get(actor)
+        if buffer is None:
+            buffer = deque(maxlen=self.size)
+            self.buffers[actor] = buffer
+        return buffer
+
+    def record_event(self, event):
+        self.buffer(event.initiator()).append(
+            ('event', event.phrase, tuple(event.participants), event.location)
+        )
+
+    def begin_chapter(self, characters):
+        """Let go of the buffers of everyone but the given characters."""
+        for actor in self.buffers.keys():
+            if actor not in characters:
+                del self.buffers[actor]
+
+    def attach(self, animate):
+        """Start recording changes to this Animate's beliefs.  Needs to
+        be done again if the Animate gets a new BeliefSet, unless it goes
+        through Animate.replace_beliefs.
+
+        """
+        buffer = self.buffer(animate)
+        def watch(beliefs, action, belief):
+            buffer.append(('belief', action, belief))
+        animate.beliefs.watcher = watch
+
+    def clear(self):
+        for buffer in self.buffers.itervalues():
+            buffer.clear()
+
+    def dump(self, stream=None):
+        if stream is None:
+            stream = sys.stderr
+        for (actor, buffer) in self.buffers.iteritems():
+            if not buffer:
+                continue
+            stream.write("FLIGHT RECORDER: LAST %d THINGS FOR %s:\n" %
+                         (len(buffer), actor.render().upper()))
+            for entry in buffer:
+                if entry[0] == 'event':
+                    (kind, phrase, participants, location) = entry
+                    stream.write("  %r in %s: %s\n" % (
+                        [p.render() for p in participants],
+                        location.render() if location is not None else None,
+                        phrase
+                    ))
+                else:
+                    (kind, action, belief) = entry
+                    stream.write("  .oO{ %s %s }\n" % (action, belief))
+            stream.write("\n")
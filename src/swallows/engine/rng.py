@@ -0,0 +1,116 @@
+import hashlib
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+### RANDOMNESS ###
+
+# every decision in the simulation is made by drawing from a RandomStream.
+# each character, and the editor, and the publisher, has a stream of its
+# own, so that seeding them (through a RandomStreams) makes a novel come
+# out the same every time -- and so that how many decisions one of them
+# makes doesn't change the decisions all the others make.
+
+class RandomStream(object):
+    """A source of random decisions, with (the parts we use of) the
+    interface of Python's random module.
+
+    Rather than calling into the underlying generator for every decision,
+    it draws batch_size uniform values at once, and hands them out one by
+    one.  If use_numpy is true, the batches are drawn by NumPy, which is
+    faster, but (naturally) produces different results from the pure
+    Python generator for the same seed.
+
+    """
+    def __init__(self, seed=None, batch_size=256, use_numpy=False):
+        if use_numpy and numpy is None:
+            raise ImportError("use_numpy requires NumPy to be installed")
+        self.batch_size = batch_size
+        self.use_numpy = use_numpy
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if self.use_numpy:
+            self.generator = numpy.random.RandomState(seed)
+        else:
+            self.generator = random.Random(seed)
+        self.batch = []
+        self.index = 0
+
+    def refill(self):
+        if self.use_numpy:
+            self.batch = self.generator.random_sample(self.batch_size).tolist()
+        else:
+            r = self.generator.random
+            self.batch = [r() for i in xrange(self.batch_size)]
+        self.index = 0
+
+    def random(self):
+        index = self.index
+        if index == len(self.batch):
+            self.refill()
+            index = 0
+        self.index = index + 1
+        return self.batch[index]
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def getstate(self):
+        return (self.generator.get_state() if self.use_numpy
+                else self.generator.getstate(),
+                list(self.batch), self.index)
+
+    def setstate(self, state):
+        (generator_state, batch, index) = state
+        if self.use_numpy:
+            self.generator.set_state(generator_state)
+        else:
+            self.generator.setstate(generator_state)
+        self.batch = list(batch)
+        self.index = index
+
+
+class RandomStreams(object):
+    """A family of named, independent RandomStreams, all derived from one
+    master seed.  Asking for the same name twice gives the same stream.
+    Reseeding reseeds every stream already handed out, in place.
+
+    If the master seed is None, the streams are seeded unpredictably.
+
+    """
+    def __init__(self, seed=None, batch_size=256, use_numpy=False):
+        self.batch_size = batch_size
+        self.use_numpy = use_numpy
+        self.master_seed = seed
+        self.streams = {}
+
+    def derive_seed(self, name):
+        if self.master_seed is None:
+            return None
+        digest = hashlib.md5('%s:%s' % (self.master_seed, name)).hexdigest()
+        return int(digest[:8], 16)
+
+    def stream(self, name):
+        stream = self.streams.get(name)
+        if stream is None:
+            stream = RandomStream(self.derive_seed(name),
+                                  batch_size=self.batch_size,
+                                  use_numpy=self.use_numpy)
+            self.streams[name] = stream
+        return stream
+
+    def seed(self, seed):
+        self.master_seed = seed
+        for (name, stream) in self.streams.iteritems():
+            stream.seed(self.derive_seed(name))
+
+
+# the streams everything draws from, unless told otherwise.
+streams = RandomStreams()
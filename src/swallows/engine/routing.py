@@ -0,0 +1,149 @@
+from collections import deque
+
+### ROUTING ###
+
+# a path-finder between any two rooms.  not too difficult, even if it
+# would be nicer in Prolog.
+
+class Router(object):
+    """The Router keeps next-hop tables over the graph formed by the exits
+    of Locations, so that "which exit do I take to get to X?" is a
+    dictionary lookup.
+
+    There is one table per destination, mapping every location that can
+    reach the destination to the exit to take next (and to how many steps
+    away the destination is.)  A table is built by a breadth-first search
+    backwards from its destination the first time it is needed, or for all
+    known locations at once by calling precompute().
+
+    Location.set_exits and Location.add_exits tell the Router about changes
+    to the graph.  Adding an exit patches every existing table in place,
+    visiting only the locations whose routes actually got shorter.
+    Removing an exit throws away only those tables whose routes went
+    through it.
+
+    """
+    def __init__(self):
+        self.exits = {}         # location -> tuple of locations
+        self.entrances = {}     # location -> set of locations exiting to it
+        self.tables = {}        # destination -> (next_hop, distance)
+        self.neighbourhoods = {}  # (location, radius) -> list
+
+    def exits_changed(self, location, old_exits, new_exits):
+        old = set(old_exits)
+        new = set(new_exits)
+        if old != new:
+            self.neighbourhoods = {}
+        self.exits[location] = tuple(new_exits)
+        self.entrances.setdefault(location, set())
+        for exit in old - new:
+            self.entrances[exit].discard(location)
+            self._exit_removed(location, exit)
+        for exit in new - old:
+            self.entrances.setdefault(exit, set()).add(location)
+            self._exit_added(location, exit)
+
+    def _exit_added(self, location, exit):
+        for (next_hop, distance) in self.tables.itervalues():
+            if exit not in distance:
+                continue
+            d = distance[exit] + 1
+            if location in distance and distance[location] <= d:
+                continue
+            distance[location] = d
+            next_hop[location] = exit
+            # routes through location got shorter; so might routes
+            # through anything that leads to location.
+            queue = deque([location])
+            while queue:
+                here = queue.popleft()
+                d = distance[here] + 1
+                for there in self.entrances.get(here, ()):
+                    if there in distance and distance[there] <= d:
+                        continue
+                    distance[there] = d
+                    next_hop[there] = here
+                    queue.append(there)
+
+    def _exit_removed(self, location, exit):
+        for destination in list(self.tables):
+            (next_hop, distance) = self.tables[destination]
+            if next_hop.get(location) is exit:
+                del self.tables[destination]
+
+    def _build(self, destination):
+        next_hop = {}
+        distance = {destination: 0}
+        queue = deque([destination])
+        while queue:
+            here = queue.popleft()
+            d = distance[here] + 1
+            for there in self.entrances.get(here, ()):
+                if there not in distance:
+                    distance[there] = d
+                    next_hop[there] = here
+                    queue.append(there)
+        table = (next_hop, distance)
+        self.tables[destination] = table
+        return table
+
+    def table(self, destination):
+        table = self.tables.get(destination)
+        if table is None:
+            table = self._build(destination)
+        return table
+
+    def precompute(self, locations=None):
+        """Build the tables for all the given destinations (or all known
+        locations) now, rather than on demand.
+
+        """
+        if locations is None:
+            locations = list(self.exits)
+        for location in locations:
+            self.table(location)
+
+    def neighbourhood(self, location, radius):
+        """Return a list of (location, distance) pairs for every location
+        that can reach the given location in at most radius steps -- that
+        is, everywhere something happening at location can be heard from --
+        nearest first.  The given location itself comes first, at distance
+        0.  The lists are cached until the exits change.
+
+        """
+        key = (location, radius)
+        neighbourhood = self.neighbourhoods.get(key)
+        if neighbourhood is None:
+            neighbourhood = [(location, 0)]
+            seen = set([location])
+            i = 0
+            while i < len(neighbourhood):
+                (here, d) = neighbourhood[i]
+                i += 1
+                if d == radius:
+                    continue
+                for there in self.entrances.get(here, ()):
+                    if there not in seen:
+                        seen.add(there)
+                        neighbourhood.append((there, d + 1))
+            self.neighbourhoods[key] = neighbourhood
+        return neighbourhood
+
+    def next_step(self, location, destination):
+        """Return the exit from location which is on a shortest path to
+        destination, or None if there is no such path (or if you are
+        already there.)
+
+        """
+        return self.table(destination)[0].get(location)
+
+    def distance(self, location, destination):
+        """Return the number of steps from location to destination, or None
+        if destination cannot be reached from location.
+
+        """
+        return self.table(destination)[1].get(location)
+
+
+# the router that Locations tell about their exits.
+router = Router()
@@ -0,0 +1,103 @@
+from collections import deque
+import heapq
+
+### RUNTIME ###
+
+# an alternative to driving the characters by calling live() on each of
+# them in turn: each Animate runs as a coroutine (a generator; see
+# Animate.run) which yields back to the Scheduler whenever it has finished
+# an action.  what it yields says when it wants to be resumed:
+#
+#   yield               -- on the next tick
+#   yield Sleep(n)      -- n ticks from now
+#   yield WaitForTopic(self)  -- when some other Animate addresses it
+#
+# other tasks -- say, something feeding events out to somewhere else as
+# they happen -- can be spawned on the same Scheduler, and take turns with
+# the characters in the same way.  there are no threads involved.
+
+class Sleep(object):
+    def __init__(self, ticks):
+        assert ticks >= 1
+        self.ticks = ticks
+
+
+class WaitForTopic(object):
+    def __init__(self, animate):
+        self.animate = animate
+
+
+class Scheduler(object):
+    """Runs tasks (generators) a tick at a time.  In each tick, every task
+    that is ready gets resumed once, in the order they became ready
+    (for tasks that just yield, that's the order they were spawned in.)
+
+    If every Animate's run() just calls live() and yields, this behaves
+    exactly like calling live() on each of them in turn, round and round.
+
+    """
+    def __init__(self):
+        self.now = 0
+        self.ready = deque()
+        self.sleeping = []      # heap of (wake at, sequence number, task)
+        self.waiting = {}       # animate -> task
+        self.sequence = 0
+
+    def spawn(self, task):
+        self.ready.append(task)
+
+    def spawn_animate(self, animate):
+        animate.runtime = self
+        self.spawn(animate.run())
+
+    def deliver(self, animate):
+        """Called (by Animate.address) when a topic has been addressed to
+        the animate; wakes it up, if it was waiting for one.
+
+        """
+        task = self.waiting.pop(animate, None)
+        if task is not None:
+            self.ready.append(task)
+
+    def tick(self):
+        while self.sleeping and self.sleeping[0][0] <= self.now:
+            (when, sequence, task) = heapq.heappop(self.sleeping)
+            self.ready.append(task)
+        current = self.ready
+        self.ready = deque()
+        for task in current:
+            try:
+                request = task.next()
+            except StopIteration:
+                continue
+            if request is None:
+                self.ready.append(task)
+            elif isinstance(request, Sleep):
+                self.sequence += 1
+                heapq.heappush(self.sleeping,
+                    (self.now + request.ticks, self.sequence, task))
+            elif isinstance(request, WaitForTopic):
+                animate = request.animate
+                if animate.topic is not None:
+                    self.ready.append(task)
+                else:
+                    self.waiting[animate] = task
+            else:
+                raise ValueError('Task yielded %r' % (request,))
+        self.now += 1
+
+    def idle(self):
+        return not (self.ready or self.sleeping)
+
+    def run(self, until=None):
+        """Run ticks until the given condition (checked before each tick)
+        holds, or there's nothing left that could run.
+
+        """
+        while not (until is not None and until()):
+            if self.idle():
+                break
+            if not self.ready:
+                # nothing to do until the next sleeper wakes up
+                self.now = max(self.now, self.sleeping[0][0])
+            self.tick()
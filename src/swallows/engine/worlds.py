@@ -0,0 +1,359 @@
+import cPickle as pickle
+import hashlib
+import inspect
+import json
+import os
+
+from swallows.engine.objects import Actor, Animate, Location
+from swallows.engine.rng import streams
+
+### WORLD DEFINITIONS ###
+
+# instead of building a world by hand in Python (see swallows/story/world.py)
+# it can be described in JSON, like so:
+#
+#   {
+#     "characters": [
+#       {"name": "Alice", "class": "FemaleCharacter",
+#        "objects": {"revolver": "revolver", "brandy": "brandy",
+#                    "dead_body": "dead body"}}
+#     ],
+#     "locations": [
+#       {"name": "kitchen", "exits": ["dining room", "front hall"]},
+#       {"id": "alices bedroom", "name": "<*> bedroom",
+#        "kind": "ProperLocation", "owner": "Alice",
+#        "exits": ["upstairs hall"]}
+#     ],
+#     "items": [
+#       {"name": "revolver", "kind": "Weapon",
+#        "location": ["bobs bed", "alices bed"]}
+#     ],
+#     "setting": ["kitchen", ...]
+#   }
+#
+# every character, location and item has an id, by which the others refer
+# to it; if not given, it's the same as its name.  "kind" (for locations and
+# items) is the name of a class in swallows.engine.objects, and "class" (for
+# characters) of one in swallows.story.characters, or either can be a full
+# dotted path to a class somewhere else.  an item's location can be a list,
+# in which case one of them is picked at random when the world is built.
+# "setting" is the locations the characters may start a chapter in; if not
+# given, it's all of them.
+#
+# compile_world() checks a definition and turns it into a compact form,
+# which build_world() makes the actual objects from.  load_world() keeps
+# the compact form of each file it has compiled in a cache, keyed by a hash
+# of the file's contents, so a world only ever gets checked once.  (only
+# the checking is saved; the objects themselves are built afresh on every
+# load, as they live in the registry of the process that loads them.  so
+# a cached load still costs an object or two per actor -- about 60ms for
+# a world of 6000 actors -- but no longer anything worse than that.)
+
+FORMAT_VERSION = 1
+
+REQUIRED_OBJECTS = ('revolver', 'brandy', 'dead_body')
+
+
+class World(object):
+    """The objects built from a world definition."""
+    def __init__(self, actors, characters, setting):
+        self.actors = actors            # id -> actor
+        self.characters = characters
+        self.setting = setting
+
+    def __getitem__(self, id):
+        return self.actors[id]
+
+
+def resolve(name, default_module):
+    if '.' in name:
+        (module_name, class_name) = name.rsplit('.', 1)
+    else:
+        (module_name, class_name) = (default_module, name)
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)
+
+
+def takes_keyword(class_, keyword):
+    """Return whether the constructor of the given class takes the given
+    keyword argument.
+
+    """
+    spec = inspect.getargspec(class_.__init__)
+    return spec.keywords is not None or keyword in spec.args
+
+
+def compile_world(definition):
+    """Check a world definition (as parsed from JSON) and return its
+    compact form.  If there is anything wrong with it, raise a ValueError
+    listing everything that is.
+
+    """
+    problems = []
+    entries = {}        # id -> (section, entry, class)
+    order = []
+    item_locations = {} # id -> list of ids of where the item might be
+
+    for (section, default_kind, default_module, base) in (
+        ('characters', None, 'swallows.story.characters', Animate),
+        ('locations', 'Location', 'swallows.engine.objects', Location),
+        ('items', 'Item', 'swallows.engine.objects', Actor),
+    ):
+        for entry in definition.get(section, ()):
+            if 'name' not in entry:
+                problems.append('%s entry without a name: %r' % (section, entry))
+                continue
+            id = entry.get('id', entry['name'])
+            if id in entries:
+                problems.append('duplicate id %r' % id)
+                continue
+            kind = entry.get('class' if section == 'characters' else 'kind',
+                             default_kind)
+            class_ = None
+            if kind is None:
+                problems.append('character %r has no class' % id)
+            else:
+                try:
+                    class_ = resolve(kind, default_module)
+                except (ImportError, AttributeError, ValueError):
+                    problems.append('%r: unknown class %r' % (id, kind))
+            if class_ is not None:
+                wrong = not (isinstance(class_, type) and issubclass(class_, base))
+                if section == 'items':
+                    wrong = wrong or issubclass(class_, (Animate, Location))
+                if wrong:
+                    problems.append('%r: %r is not a kind of %s' % (
+                        id, kind, section[:-1]
+                    ))
+                    class_ = None
+            entries[id] = (section, entry, class_)
+            order.append(id)
+
+    def check_ref(id, what, ref, sections=None):
+        if ref not in entries:
+            problems.append('%r: %s %r does not exist' % (id, what, ref))
+            return False
+        if sections is not None and entries[ref][0] not in sections:
+            problems.append('%r: %s %r is not one of the %s' % (
+                id, what, ref, ' or '.join(sections)
+            ))
+            return False
+        return True
+
+    for id in order:
+        (section, entry, class_) = entries[id]
+        if 'owner' in entry:
+            check_ref(id, 'owner', entry['owner'])
+        # build_world passes these on to the class's constructor, so it had
+        # better take them
+        if class_ is not None:
+            keys = ('owner', 'noun', 'enter')
+            if section == 'items':
+                keys += ('location',)
+            for key in keys:
+                if key in entry and not takes_keyword(class_, key):
+                    problems.append('%r: a %s cannot be given %s' % (
+                        id, class_.__name__, key
+                    ))
+        if section == 'locations':
+            for exit in entry.get('exits', ()):
+                check_ref(id, 'exit', exit, ('locations',))
+        elif section == 'items':
+            locations = entry.get('location')
+            if locations is None:
+                problems.append('%r: has no location' % id)
+                locations = []
+            elif not isinstance(locations, list):
+                locations = [locations]
+            item_locations[id] = locations
+            for location in locations:
+                if check_ref(id, 'location', location):
+                    holder = entries[location][2]
+                    if holder is not None and not holder.can_contain:
+                        problems.append('%r: location %r cannot have things in it' % (
+                            id, location
+                        ))
+        elif section == 'characters':
+            objects = entry.get('objects', {})
+            for name in REQUIRED_OBJECTS:
+                if name not in objects:
+                    problems.append('%r: no %s given in objects' % (id, name))
+            for (name, ref) in objects.items():
+                check_ref(id, name, ref, ('items',))
+
+    setting = definition.get('setting')
+    if setting is None:
+        setting = [id for id in order if entries[id][0] == 'locations']
+    for id in setting:
+        check_ref('setting', 'location', id, ('locations',))
+
+    # the rest of the checks carry on past any bad references found above
+    # (skipping them), so that everything wrong is reported at once.
+    def is_location(id):
+        return id in entries and entries[id][0] == 'locations'
+
+    # a character may start a chapter in any location in the setting, and
+    # should be able to get everywhere from there -- so every location has
+    # to be reachable from every one in the setting.  that's so if every
+    # location can be reached from one of them, and that one can be reached
+    # from all the others: one search forward along the exits, and one
+    # backward, rather than one from each location in the setting.
+    locations = [id for id in order if entries[id][0] == 'locations']
+    starts = [id for id in setting if is_location(id)]
+    if starts:
+        entrances = dict([(id, []) for id in locations])
+        for id in locations:
+            for exit in entries[id][1].get('exits', ()):
+                if is_location(exit):
+                    entrances[exit].append(id)
+        def reachable(start, neighbours):
+            found = set([start])
+            pending = [start]
+            while pending:
+                for id in neighbours(pending.pop()):
+                    if is_location(id) and id not in found:
+                        found.add(id)
+                        pending.append(id)
+            return found
+        hub = starts[0]
+        from_hub = reachable(hub, lambda id: entries[id][1].get('exits', ()))
+        to_hub = reachable(hub, lambda id: entrances[id])
+        for id in locations:
+            if id not in from_hub:
+                problems.append('%r: cannot be reached from %r (in the setting)' % (
+                    id, hub
+                ))
+        for id in starts:
+            if id not in to_hub:
+                problems.append('%r: is in the setting, but %r cannot be reached from it' % (
+                    id, hub
+                ))
+
+    # put things after what they're in and whoever owns them (and fail if
+    # something ends up inside, or owned by, itself)
+    placed = []
+    state = {}
+    def place(id, path):
+        if state.get(id) == 'placed':
+            return
+        if state.get(id) == 'placing':
+            problems.append('%r: is inside or owned by itself (%s)' % (
+                id, ' -> '.join(path + [id])
+            ))
+            return
+        state[id] = 'placing'
+        owner = entries[id][1].get('owner')
+        if owner in entries:
+            place(owner, path + [id])
+        for location in item_locations.get(id, ()):
+            if location in entries:
+                place(location, path + [id])
+        state[id] = 'placed'
+        placed.append(id)
+    # characters first, since they own things; then locations, then items
+    for id in order:
+        place(id, [])
+
+    if problems:
+        raise ValueError('Bad world definition:\n  ' + '\n  '.join(problems))
+
+    index = dict([(id, n) for (n, id) in enumerate(placed)])
+    classes = []
+    class_index = {}
+    actors = []
+    exits = []
+    bindings = []
+    for id in placed:
+        (section, entry, class_) = entries[id]
+        path = '%s.%s' % (class_.__module__, class_.__name__)
+        if path not in class_index:
+            class_index[path] = len(classes)
+            classes.append(path)
+        options = {}
+        for key in ('noun', 'enter'):
+            if key in entry:
+                options[str(key)] = entry[key].encode('utf-8')
+        actors.append((
+            id, class_index[path], entry['name'].encode('utf-8'), options,
+            index.get(entry.get('owner'), -1),
+            tuple([index[location] for location in item_locations.get(id, ())])
+        ))
+        if section == 'locations':
+            exits.append((index[id], tuple([index[exit] for exit in entry.get('exits', ())])))
+        elif section == 'characters':
+            bindings.append((index[id], dict([
+                (str(name), index[ref])
+                for (name, ref) in entry.get('objects', {}).items()
+            ])))
+    return (FORMAT_VERSION, tuple(classes), tuple(actors), tuple(exits),
+            tuple(bindings), tuple([index[id] for id in setting]))
+
+
+def build_world(compiled, rng=None):
+    """Make the objects described by a compiled world definition, and
+    return them as a World.
+
+    """
+    (version, class_paths, actors, exits, bindings, setting) = compiled
+    assert version == FORMAT_VERSION
+    if rng is None:
+        rng = streams.stream('world')
+    classes = [resolve(path, None) for path in class_paths]
+    objects = []
+    by_id = {}
+    for (id, class_index, name, options, owner, locations) in actors:
+        kwargs = dict(options)
+        if owner >= 0:
+            kwargs['owner'] = objects[owner]
+        if len(locations) == 1:
+            kwargs['location'] = objects[locations[0]]
+        elif locations:
+            kwargs['location'] = rng.choice([objects[n] for n in locations])
+        actor = classes[class_index](name, **kwargs)
+        objects.append(actor)
+        by_id[id] = actor
+    for (location, location_exits) in exits:
+        objects[location].set_exits(*[objects[n] for n in location_exits])
+    characters = []
+    for (character, objects_) in bindings:
+        objects[character].configure_objects(**dict([
+            (name, objects[n]) for (name, n) in objects_.items()
+        ]))
+        characters.append(objects[character])
+    return World(by_id, characters, tuple([objects[n] for n in setting]))
+
+
+def load_world(path, cache_dir=None, rng=None):
+    """Read, check and build the world defined in the JSON file at path.
+    If cache_dir is given, the compiled form is kept there (as a pickle
+    named for the SHA-1 of the file's contents), and used instead of
+    compiling the file again, for as long as the file doesn't change.
+    (The objects are built afresh either way; see above.)
+
+    """
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    compiled = None
+    cache_path = None
+    if cache_dir is not None:
+        key = hashlib.sha1('%d:%s' % (FORMAT_VERSION, data)).hexdigest()
+        cache_path = os.path.join(cache_dir, key + '.world')
+        if os.path.exists(cache_path):
+            f = open(cache_path, 'rb')
+            compiled = pickle.load(f)
+            f.close()
+    if compiled is None:
+        compiled = compile_world(json.loads(data))
+        if cache_path is not None:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # written under another name and renamed into place, so that
+            # someone loading the same world at the same time never sees
+            # half of it
+            temp_path = '%s.%d' % (cache_path, os.getpid())
+            f = open(temp_path, 'wb')
+            pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+            f.close()
+            os.rename(temp_path, cache_path)
+    return build_world(compiled, rng=rng)
@@ -0,0 +1,150 @@
+from cgi import escape
+import json
+import re
+import sys
+
+from swallows.engine.event import AggregateEvent
+
+### WRITERS ###
+
+# a Writer turns the Editor's paragraphs into some output format.  the
+# Publisher renders each paragraph once and hands the same events and
+# sentences to every one of its Writers, so a novel can be written out in
+# several formats at once without generating (or editing) it again.
+
+EMPHASIS = re.compile(r'(\*|_)(\S(?:.*?\S)?)\1')
+
+
+class Writer(object):
+    def __init__(self, stream=None):
+        if stream is None:
+            stream = sys.stdout
+        self.stream = stream
+
+    def begin_novel(self, title):
+        pass
+
+    def begin_chapter(self, chapter_num):
+        pass
+
+    def paragraph(self, editor, paragraph_num, events, sentences):
+        pass
+
+    def end_chapter(self, chapter_num):
+        pass
+
+    def end_novel(self):
+        pass
+
+
+class MarkdownWriter(Writer):
+    """Writes the novel the way it has always been written."""
+    def begin_novel(self, title):
+        self.stream.write("%s\n%s\n\n" % (title, "=" * len(title)))
+
+    def begin_chapter(self, chapter_num):
+        self.stream.write("Chapter %d.\n-----------\n\n" % chapter_num)
+
+    def paragraph(self, editor, paragraph_num, events, sentences):
+        for sentence in sentences:
+            self.stream.write(sentence + "  ")
+        self.stream.write("\n\n")
+
+
+class PlainTextWriter(Writer):
+    """Writes the novel as plain text, without Markdown markup."""
+    def plain(self, text):
+        return EMPHASIS.sub(r'\2', text)
+
+    def begin_novel(self, title):
+        title = self.plain(title)
+        self.stream.write("%s\n\n" % title.upper())
+
+    def begin_chapter(self, chapter_num):
+        self.stream.write("Chapter %d.\n\n" % chapter_num)
+
+    def paragraph(self, editor, paragraph_num, events, sentences):
+        self.stream.write(
+            self.plain(' '.join(sentences)) + "\n\n"
+        )
+
+
+class HTMLWriter(Writer):
+    """Writes the novel as a single HTML document."""
+    def html(self, text):
+        return EMPHASIS.sub(r'<em>\2</em>', escape(text))
+
+    def begin_novel(self, title):
+        self.stream.write(
+            '<!DOCTYPE html>\n<html>\n<head>\n'
+            '<meta charset="utf-8">\n<title>%s</title>\n'
+            '</head>\n<body>\n<h1>%s</h1>\n' % (
+                escape(EMPHASIS.sub(r'\2', title)), self.html(title)
+            )
+        )
+
+    def begin_chapter(self, chapter_num):
+        self.stream.write('<h2>Chapter %d.</h2>\n' % chapter_num)
+
+    def paragraph(self, editor, paragraph_num, events, sentences):
+        self.stream.write('<p>%s</p>\n' % self.html(' '.join(sentences)))
+
+    def end_novel(self):
+        self.stream.write('</body>\n</html>\n')
+
+
+class JSONWriter(Writer):
+    """Writes the novel as a JSON document: a title and a list of chapters,
+    each a list of paragraphs, each a list of sentences.  Along with its
+    text, each sentence records the event it was rendered from: the
+    phrase template, who took part, where, who was speaking to whom, and
+    so on.  The document is written out at the end of the novel.
+
+    """
+    def begin_novel(self, title):
+        self.novel = {'title': title, 'chapters': []}
+
+    def begin_chapter(self, chapter_num):
+        self.chapter = {'number': chapter_num, 'paragraphs': []}
+        self.novel['chapters'].append(self.chapter)
+
+    def describe(self, event):
+        def name(actor):
+            # the bare name, as render() puts an article on it ("the the
+            # weather"), or "my" or "your", depending on the event
+            if actor is None:
+                return None
+            name = actor.name
+            if '<*>' in name and actor.owner is not None:
+                name = name.replace('<*>', "%s's" % actor.owner.name)
+            return name
+        if isinstance(event, AggregateEvent):
+            return {
+                'template': event.template,
+                'initiator': name(event.initiator()),
+                'location': name(event.location),
+                'excl': event.excl,
+                'events': [self.describe(e) for e in event.events],
+            }
+        return {
+            'template': event.phrase,
+            'initiator': name(event.initiator()),
+            'participants': [name(p) for p in event.participants],
+            'location': name(event.location),
+            'speaker': name(event.speaker),
+            'addressed_to': name(event.addressed_to),
+            'exciting': event.exciting,
+            'excl': event.excl,
+        }
+
+    def paragraph(self, editor, paragraph_num, events, sentences):
+        paragraph = {'number': paragraph_num, 'sentences': []}
+        for (event, sentence) in zip(events, sentences):
+            description = self.describe(event)
+            description['text'] = sentence
+            paragraph['sentences'].append(description)
+        self.chapter['paragraphs'].append(paragraph)
+
+    def end_novel(self):
+        json.dump(self.novel, self.stream, indent=1)
+        self.stream.write("\n")
@@ -18,14 +18,14 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import random
 import sys
 
 from swallows.engine.objects import (
-    Animate, ProperMixin, MasculineMixin, FeminineMixin,
-    Topic,
+    Animate, Location, ProperMixin, MasculineMixin, FeminineMixin,
+    Topic, converses_about,
     GreetTopic, SpeechTopic, QuestionTopic,
-    Belief, ItemLocation, Goal,
+    Belief, ItemLocation, Goal, Desire,
+    registry,
 )
 
 # TODO
@@ -33,13 +33,10 @@ from swallows.engine.objects import (
 # They can hide something, then see the other carrying it, then check that
 # it's still hidden, and be surprised that it's no longer ther.
 # 'Hello, Alice', said Bob.  'Hello, Bob', replied Alice.  NEVER GETS OLD
-# they should always scream at seeing the dead body.  the scream should
-#   be heard throughout the house and yard.
+# they should always scream at seeing the dead body.
 # ...they check that the brandy is still in the liquor cabinet.  is this
 #   really necessary?
 # certain things can't be taken, but can be dragged (like the body)
-# path-finder between any two rooms -- not too difficult, even if it
-#   would be nicer in Prolog.
 # "it was so nice" -- actually *have* memories of locations, and feelings
 #   (good/bad, 0 to 10 or something) about memories
 # anxiety memory = the one they're most recently panicked about
@@ -83,6 +80,8 @@ class SuspicionOfHiding(Belief):
 ### Base character personalities for The Swallows
 
 class Character(Animate):
+    __slots__ = ('nerves', 'revolver', 'brandy', 'dead_body', 'investigating')
+
     def __init__(self, name, location=None, collector=None):
         """Constructor specific to characters.  In it, we set up some
         Swallows-specific properties ('nerves').
@@ -92,6 +91,23 @@ class Character(Animate):
         # this should really be *derived* from having a recent memory
         # of seeing a dead body in the bathroom.  but for now,
         self.nerves = 'calm'
+        # where we heard a cry come from, and are going to see about
+        self.investigating = None
+
+    # how many exits away a scream can be heard from.  (throughout the
+    # house and yard, more or less.)
+    scream_radius = 4
+
+    def get_state(self):
+        state = Animate.get_state(self)
+        state['nerves'] = self.nerves
+        state['investigating'] = self.investigating
+        return state
+
+    def set_state(self, state):
+        Animate.set_state(self, state)
+        self.nerves = state['nerves']
+        self.investigating = state['investigating']
 
     def configure_objects(self, revolver=None, brandy=None, dead_body=None):
         """Here we set up some important items that this character needs
@@ -102,6 +118,19 @@ class Character(Animate):
         self.brandy = brandy
         self.dead_body = dead_body
 
+    def hear(self, event, distance):
+        # if it happened right here, we saw it happen, no need to mention
+        # that we heard it too
+        if distance > 0:
+            self.emit("<1> heard a distant cry", [self], excl=True)
+            # and go and see what it was, once we get the chance
+            self.investigating = event.location
+
+    def place_in(self, location):
+        # whatever we heard last chapter, we've forgotten about it
+        self.investigating = None
+        Animate.place_in(self, location)
+
     def believe_location(self, thing, location, informant=None, concealer=None):
         # we override this method of Animate in order to also remove
         # our suspicion that the item has been hidden.  'cos we found it.
@@ -113,7 +142,7 @@ class Character(Animate):
 
         """
         Animate.move_to(self, location)
-        if random.randint(0, 10) == 0:
+        if self.rng.randint(0, 10) == 0:
             self.emit("It was so nice being in <2> again",
              [self, self.location], excl=True)
         
@@ -122,48 +151,53 @@ class Character(Animate):
             assert x.location == self.location
             if x == self:
                 continue
-            if x.horror():
+            if x.is_horror:
                 belief = self.recall_location(x)
                 if belief:
-                    amount = random.choice(['shudder', 'wave'])
-                    emotion = random.choice(['fear', 'disgust', 'sickness', 'loathing'])
+                    amount = self.rng.choice(['shudder', 'wave'])
+                    emotion = self.rng.choice(['fear', 'disgust', 'sickness', 'loathing'])
                     self.emit("<1> felt a %s of %s as <he-1> looked at <2>" % (amount, emotion), [self, x])
                     self.remember_location(x, self.location)
                 else:
-                    verb = random.choice(['screamed', 'yelped', 'went pale'])
-                    self.emit("<1> %s at the sight of <indef-2>" % verb, [self, x], excl=True)
+                    verb = self.rng.choice(['screamed', 'yelped', 'went pale'])
+                    radius = 0
+                    if verb != 'went pale':
+                        radius = self.scream_radius
+                    self.emit("<1> %s at the sight of <indef-2>" % verb, [self, x],
+                              excl=True, radius=radius)
                     self.remember_location(x, self.location)
                     self.nerves = 'shaken'
-            elif x.animate():
+            elif x.is_animate:
                 other = x
                 self.emit("<1> saw <2>", [self, other])
                 other.emit("<1> saw <2> walk into the %s" % self.location.noun(), [other, self])
                 self.remember_location(x, self.location)
                 self.greet(x, "'Hello, <2>,' said <1>")
-                for y in other.contents:
-                    if y.treasure():
-                        self.emit(
-                            "<1> noticed <2> <was-2> carrying <indef-3>",
+                # (anything they're carrying, even inside something else
+                # they're carrying; see respond_to_threat_give_me)
+                for y in registry.treasures_under(other):
+                    self.emit(
+                        "<1> noticed <2> <was-2> carrying <indef-3>",
+                        [self, other, y])
+                    if self.revolver.location == self:
+                        self.point_at(other, self.revolver)
+                        self.address(other,
+                            ThreatGiveMeTopic(self, subject=y),
+                            "'Please give me <3>, <2>, or I shall shoot you,' <he-1> said",
                             [self, other, y])
-                        if self.revolver.location == self:
-                            self.point_at(other, self.revolver)
-                            self.address(other,
-                                ThreatGiveMeTopic(self, subject=y),
-                                "'Please give me <3>, <2>, or I shall shoot you,' <he-1> said",
-                                [self, other, y])
-                            return
+                        return
                 # check if we suspect something of being hidden.
                 suspicions = list(self.beliefs.beliefs_of_class(SuspicionOfHiding))
                 # if we do... and we can do something about it...
                 actionable_suspicions = []
                 for suspicion in suspicions:
-                    if not suspicion.subject.treasure():
+                    if not suspicion.subject.is_treasure:
                         continue
                     if self.beliefs.get(ItemLocation(suspicion.subject)):
                         continue
                     actionable_suspicions.append(suspicion)
                 if actionable_suspicions and self.revolver.location == self:
-                    suspicion = random.choice(actionable_suspicions)
+                    suspicion = self.rng.choice(actionable_suspicions)
                     self.point_at(other, self.revolver)
                     self.address(other,
                         ThreatTellMeTopic(self, subject=suspicion.subject),
@@ -188,28 +222,36 @@ class Character(Animate):
             if self.does_desire(x):
                 self.pick_up(x)
                 return
+
+        # otherwise, if we heard someone cry out, go and see what happened
+        if self.investigating is not None:
+            if self.head_towards(self.investigating):
+                if self.location is self.investigating:
+                    self.investigating = None
+                return
+            self.investigating = None
+
         people_about = False
 
         # otherwise, fixate on some valuable object (possibly the revolver)
         # that you are carrying:
         fixated_on = None
-        for y in self.contents:
-            if y.treasure():
-                fixated_on = y
-                break
-        if not fixated_on and random.randint(0, 20) == 0 and self.revolver.location == self:
+        treasures = registry.treasures_under(self)
+        if treasures:
+            fixated_on = treasures[0]
+        if not fixated_on and self.rng.randint(0, 20) == 0 and self.revolver.location == self:
             fixated_on = self.revolver
 
         # check if you are alone
         for x in self.location.contents:
-            if x.animate() and x is not self:
+            if x.is_animate and x is not self:
                 people_about = True
 
-        choice = random.randint(0, 25)
+        choice = self.rng.randint(0, 25)
         if choice < 10 and not people_about:
             return self.hide_and_seek(fixated_on)
         if choice < 20:
-            return self.wander()
+            return self.go_somewhere()
         if choice == 20:
             self.emit("<1> yawned", [self])
         elif choice == 21:
@@ -221,7 +263,34 @@ class Character(Animate):
         elif choice == 24:
             self.emit("<1> immediately had a feeling something was amiss", [self])
         else:
-            return self.wander()
+            return self.go_somewhere()
+
+    def go_somewhere(self):
+        """If there's something we want, and we remember where it is,
+        head for it.  Otherwise, just wander.
+
+        """
+        for desire in self.beliefs.beliefs_of_class(Desire):
+            destination = self.where_to_look_for(desire.subject)
+            if destination is not None and self.head_towards(destination):
+                return
+        return self.wander()
+
+    def where_to_look_for(self, thing):
+        """Return the Location we believe the thing to be in (even if
+        it's inside a container there), or None if we don't know, or if
+        we think someone is carrying it around.
+
+        """
+        belief = self.recall_location(thing)
+        if belief is None:
+            return None
+        place = belief.location
+        while place is not None and not isinstance(place, Location):
+            if place.is_animate:
+                return None
+            place = place.location
+        return place
 
     #
     # The following are fairly plot-specific.
@@ -231,7 +300,7 @@ class Character(Animate):
         # check for some place to hide the thing you're fixating on
         containers = []
         for container in self.location.contents:
-            if container.container():
+            if container.is_container:
                 # did I hide something here previously?
                 beliefs_about_container = []
                 for thing in self.beliefs.subjects():
@@ -245,7 +314,7 @@ class Character(Animate):
         # ok!  we now have a list of containers, each of which has zero or
         # more beliefs of things being in it.
         if fixated_on:
-            (container, beliefs) = random.choice(containers)
+            (container, beliefs) = self.rng.choice(containers)
             self.emit("<1> hid <2> in <3>", [self, fixated_on, container])
             fixated_on.move_to(container)
             self.remember_location(fixated_on, container, concealer=self)
@@ -253,15 +322,15 @@ class Character(Animate):
         else:
             # we're looking for treasure!
             # todo: it would maybe be better to prioritize this selection
-            (container, beliefs) = random.choice(containers)
+            (container, beliefs) = self.rng.choice(containers)
             # sometimes, we don't care what we think we know about something
             # (this lets us, for example, explore things in hopes of brandy)
-            if beliefs and random.randint(0, 3) == 0:
+            if beliefs and self.rng.randint(0, 3) == 0:
                 beliefs = None
             if beliefs:
-                belief = random.choice(beliefs)
+                belief = self.rng.choice(beliefs)
                 thing = belief.subject
-                picking_up = random.randint(0, 5) == 0
+                picking_up = self.rng.randint(0, 5) == 0
                 if thing is self.revolver:
                     picking_up = True
                 if picking_up:
@@ -300,124 +369,147 @@ class Character(Animate):
                     if self.does_desire(thing):
                         desired_things.append(thing)
                 if desired_things:
-                    thing = random.choice(desired_things)
+                    thing = self.rng.choice(desired_things)
                     self.emit("<1> found <2> there, and took <him-2>",
                               [self, thing, container], exciting=True)
                     thing.move_to(self)
                     self.remember_location(thing, self)
 
-    def converse(self, topic):
-        self.topic = None
+    @converses_about(ThreatGiveMeTopic)
+    def respond_to_threat_give_me(self, topic):
         other = topic.originator
-        if isinstance(topic, ThreatGiveMeTopic):
-            found_object = None
-            for x in self.contents:
-                if x is topic.subject:
-                    found_object = x
-                    break
-            if not found_object:
-                self.speak_to(other,
-                    "'But I don't have <3>!' protested <1>",
-                    [self, other, topic.subject])
-            else:
-                self.speak_to(other,
-                    "'Please don't shoot!', <1> cried",
-                    [self, other, found_object])
-                self.give_to(other, found_object)
-        elif isinstance(topic, ThreatTellMeTopic):
-            belief = self.recall_location(topic.subject)
-            if not belief:
-                self.speak_to(other,
-                    "'I have no memory of that, <2>,' <1> replied",
-                    [self, other, topic.subject])
-            else:
-                self.speak_to(other,
-                    "'Please don't shoot!', <1> cried, '<he-3> <is-3> in <4>'",
-                    [self, other, topic.subject, belief.location])
-                other.believe_location(topic.subject, belief.location,
-                    informant=self, concealer=self)
-        elif isinstance(topic, ThreatAgreeTopic):
+        found_object = None
+        if registry.holder(topic.subject) is self:
+            found_object = topic.subject
+        if not found_object:
             self.speak_to(other,
-               "'You make a persuasive case for remaining undecided, <2>,' said <1>",
-               [self, other])
-            self.beliefs.remove(Goal(topic.subject))
-            # update other's BeliefsBelief about self to no longer
-            # contain this Goal
-            other.believed_beliefs_of(self).remove(Goal(topic.subject))
-        elif isinstance(topic, GreetTopic):
-            # emit, because making this a speak_to leads to too much silliness
-            self.emit("'Hello, <2>,' replied <1>", [self, other])
-            # this needs to be more general
-            self_belief = self.recall_location(self.dead_body)
-            if self_belief:
-                self.discuss(other, self_belief)
+                "'But I don't have <3>!' protested <1>",
+                [self, other, topic.subject])
+        else:
+            self.speak_to(other,
+                "'Please don't shoot!', <1> cried",
+                [self, other, found_object])
+            if found_object.location is not self:
+                # it's in something we're carrying; get it out first
+                self.emit("<1> took <2> out of <3>",
+                          [self, found_object, found_object.location])
+                found_object.move_to(self)
+            self.give_to(other, found_object)
+
+    @converses_about(ThreatTellMeTopic)
+    def respond_to_threat_tell_me(self, topic):
+        other = topic.originator
+        belief = self.recall_location(topic.subject)
+        if not belief:
+            self.speak_to(other,
+                "'I have no memory of that, <2>,' <1> replied",
+                [self, other, topic.subject])
+        else:
+            self.speak_to(other,
+                "'Please don't shoot!', <1> cried, '<he-3> <is-3> in <4>'",
+                [self, other, topic.subject, belief.location])
+            other.believe_location(topic.subject, belief.location,
+                informant=self, concealer=self)
+
+    @converses_about(ThreatAgreeTopic)
+    def respond_to_threat_agree(self, topic):
+        other = topic.originator
+        self.speak_to(other,
+           "'You make a persuasive case for remaining undecided, <2>,' said <1>",
+           [self, other])
+        self.beliefs.remove(Goal(topic.subject))
+        # update other's BeliefsBelief about self to no longer
+        # contain this Goal
+        other.believed_beliefs_of(self).remove(Goal(topic.subject))
+
+    @converses_about(GreetTopic)
+    def respond_to_greeting(self, topic):
+        other = topic.originator
+        # emit, because making this a speak_to leads to too much silliness
+        self.emit("'Hello, <2>,' replied <1>", [self, other])
+        # this needs to be more general
+        self_belief = self.recall_location(self.dead_body)
+        if self_belief:
+            self.discuss(other, self_belief)
+            return
+        # this need not be *all* the time
+        for x in other.contents:
+            if x.notable():
+                self.remember_location(x, other)
+                self.speak_to(other, "'I see you are carrying <indef-3>,' said <1>", [self, other, x])
                 return
-            # this need not be *all* the time
-            for x in other.contents:
-                if x.notable():
-                    self.remember_location(x, other)
-                    self.speak_to(other, "'I see you are carrying <indef-3>,' said <1>", [self, other, x])
-                    return
-            choice = random.randint(0, 3)
+        choice = self.rng.randint(0, 3)
+        if choice == 0:
+            self.question(other, "'Lovely weather we're having, isn't it?' asked <1>")
+        if choice == 1:
+            self.speak_to(other, "'I was wondering where you were,' said <1>")
+
+    @converses_about(QuestionTopic)
+    def respond_to_question(self, topic):
+        other = topic.originator
+        if topic.subject is not None:
+            choice = self.rng.randint(0, 1)
             if choice == 0:
-                self.question(other, "'Lovely weather we're having, isn't it?' asked <1>")
+                self.speak_to(other, "'I know nothing about <3>, <2>,' explained <1>",
+                   [self, other, topic.subject])
             if choice == 1:
-                self.speak_to(other, "'I was wondering where you were,' said <1>")
-        elif isinstance(topic, QuestionTopic):
-            if topic.subject is not None:
-                choice = random.randint(0, 1)
-                if choice == 0:
-                    self.speak_to(other, "'I know nothing about <3>, <2>,' explained <1>",
-                       [self, other, topic.subject])
-                if choice == 1:
-                    self.speak_to(other, "'Perhaps, <2>,' replied <1>")
-            else:
                 self.speak_to(other, "'Perhaps, <2>,' replied <1>")
-        elif isinstance(topic, WhereQuestionTopic):
-            belief = self.recall_location(topic.subject)
-            if not belief:
-                self.speak_to(other,
-                    "'I don't know,' <1> answered simply",
-                    [self, other, topic.subject])
-            elif belief.concealer == self:
-                self.question(other,
-                    "'Why do you want to know where <3> is, <2>?'",
-                    [self, other, topic.subject])
-            elif topic.subject.location == self:
+        else:
+            self.speak_to(other, "'Perhaps, <2>,' replied <1>")
+
+    @converses_about(WhereQuestionTopic)
+    def respond_to_where_question(self, topic):
+        other = topic.originator
+        belief = self.recall_location(topic.subject)
+        if not belief:
+            self.speak_to(other,
+                "'I don't know,' <1> answered simply",
+                [self, other, topic.subject])
+        elif belief.concealer == self:
+            self.question(other,
+                "'Why do you want to know where <3> is, <2>?'",
+                [self, other, topic.subject])
+        elif topic.subject.location == self:
+            self.speak_to(other,
+                "'I've got <3> right here, <2>'",
+                [self, other, topic.subject])
+            self.put_down(topic.subject)
+        else:
+            # if someone is carrying it -- someone besides whoever's
+            # asking, that is, who would hardly need telling
+            holder = registry.holder(topic.subject)
+            if holder is not None and holder is not other:
                 self.speak_to(other,
-                    "'I've got <3> right here, <2>'",
-                    [self, other, topic.subject])
-                self.put_down(topic.subject)
+                    "'I think <3> has <4>,', <1> recalled",
+                    [self, other, belief.location, topic.subject])
             else:
-                if topic.subject.location.animate():
-                    self.speak_to(other,
-                        "'I think <3> has <4>,', <1> recalled",
-                        [self, other, belief.location, topic.subject])
-                else:
-                    self.speak_to(other,
-                        "'I believe it's in <3>, <2>,', <1> recalled",
-                        [self, other, belief.location])
-                other.believe_location(
-                    topic.subject, belief.location, informant=self
-                )
-        elif isinstance(topic, SpeechTopic):
-            choice = random.randint(0, 5)
-            if choice == 0:
-                self.emit("<1> nodded", [self])
-            if choice == 1:
-                self.emit("<1> remained silent", [self])
-            if choice == 2:
-                self.question(other, "'Do you really think so?' asked <1>")
-            if choice == 3:
-                self.speak_to(other, "'Yes, it's a shame really,' stated <1>")
-            if choice == 4:
-                self.speak_to(other, "'Oh, I know, I know,' said <1>")
-            if choice == 5:
-                # -- this is getting really annoying.  disable for now. --
-                # item = random.choice(ALL_ITEMS)
-                # self.question(other, "'But what about <3>, <2>?' posed <1>",
-                #    [self, other, item], subject=item)
-                self.speak_to(other, "'I see, <2>, I see,' said <1>")
+                self.speak_to(other,
+                    "'I believe it's in <3>, <2>,', <1> recalled",
+                    [self, other, belief.location])
+            other.believe_location(
+                topic.subject, belief.location, informant=self
+            )
+
+    @converses_about(SpeechTopic)
+    def respond_to_speech(self, topic):
+        other = topic.originator
+        choice = self.rng.randint(0, 5)
+        if choice == 0:
+            self.emit("<1> nodded", [self])
+        if choice == 1:
+            self.emit("<1> remained silent", [self])
+        if choice == 2:
+            self.question(other, "'Do you really think so?' asked <1>")
+        if choice == 3:
+            self.speak_to(other, "'Yes, it's a shame really,' stated <1>")
+        if choice == 4:
+            self.speak_to(other, "'Oh, I know, I know,' said <1>")
+        if choice == 5:
+            # -- this is getting really annoying.  disable for now. --
+            # item = random.choice(ALL_ITEMS)
+            # self.question(other, "'But what about <3>, <2>?' posed <1>",
+            #    [self, other, item], subject=item)
+            self.speak_to(other, "'I see, <2>, I see,' said <1>")
 
     # this is its own method for indentation reasons
     def discuss(self, other, self_memory):
@@ -440,7 +532,7 @@ class Character(Animate):
             other.believed_beliefs_of(self).add(self_memory)
             return
         else:
-            choice = random.randint(0, 2)
+            choice = self.rng.randint(0, 2)
             if choice == 0:
                 self.question(other, "'Do you think we should do something about <3>?' asked <1>",
                     [self, other, self_memory.subject])
@@ -465,7 +557,7 @@ class Character(Animate):
                             [self, other, self_memory.subject],
                             subject=self.brandy)
                         self.desire(self.brandy)
-                        if random.randint(0, 1) == 0:
+                        if self.rng.randint(0, 1) == 0:
                             self.address(other, WhereQuestionTopic(self, subject=self.brandy),
                                 "'Where did you say <3> was?'",
                                 [self, other, self.brandy])
@@ -482,7 +574,7 @@ class Character(Animate):
         # gunpoint yet, or not, or something
         my_goal = self.beliefs.get(Goal(thing))
         if my_goal is None:
-            if random.randint(0, 1) == 0:
+            if self.rng.randint(0, 1) == 0:
                 self.beliefs.add(Goal(thing, 'call the police about'))
             else:
                 self.beliefs.add(Goal(thing, 'try to dispose of'))
@@ -529,8 +621,8 @@ class Character(Animate):
 
 
 class MaleCharacter(MasculineMixin, ProperMixin, Character):
-    pass
+    __slots__ = ()
 
 
 class FemaleCharacter(FeminineMixin, ProperMixin, Character):
-    pass
+    __slots__ = ()
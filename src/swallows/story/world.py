@@ -18,13 +18,12 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import random
-
 from swallows.engine.objects import (
     Location, ProperLocation, Treasure, PluralTreasure,
     Container, ProperContainer,
     Item, Weapon, Horror
 )
+from swallows.engine.rng import streams
 from swallows.story.characters import MaleCharacter, FemaleCharacter
 
 # TODO
@@ -90,7 +89,7 @@ bobs_bed = ProperContainer("<*> bed", location=bobs_bedroom, owner=bob)
 alices_bed = ProperContainer("<*> bed", location=alices_bedroom, owner=alice)
 
 brandy = Item('bottle of brandy', location=liquor_cabinet)
-revolver = Weapon('revolver', location=random.choice([bobs_bed, alices_bed]))
+revolver = Weapon('revolver', location=streams.stream('world').choice([bobs_bed, alices_bed]))
 dead_body = Horror('dead body', location=bathroom)
 
 # when making alice and bob, we let them recognize certain important